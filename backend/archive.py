@@ -0,0 +1,178 @@
+import asyncio
+import heapq
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from database import (
+    engine, User, Project, CollaborationRequest, project_collaborators,
+    projects_archive, project_collaborators_archive, collaboration_requests_archive
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", 3600))
+# Délai depuis la dernière modification avant archivage
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+ARCHIVE_BATCH_SIZE = 500
+
+FINISHED_PROJECT_STATUSES = ("termine",)
+RESOLVED_REQUEST_STATUSES = ("accepted", "rejected")
+
+projects = Project.__table__
+collaboration_requests = CollaborationRequest.__table__
+
+
+def _move(conn, source, target, condition, **values) -> int:
+    """INSERT ... SELECT puis DELETE des lignes de `source` vers `target`.
+    `values` remplace certaines colonnes (date d'archivage, date de modification)"""
+    names = [column.name for column in target.columns]
+    columns = [
+        literal(values[name], target.c[name].type) if name in values else source.c[name]
+        for name in names
+    ]
+    conn.execute(insert(target).from_select(names, select(*columns).where(condition)))
+    return conn.execute(delete(source).where(condition)).rowcount
+
+
+# ==================== ARCHIVAGE ====================
+
+class ArchiveJob:
+    """Déplace périodiquement les projets terminés (avec collaborateurs et
+    demandes) et les demandes traitées vers les tables d'archive"""
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+
+    def run_once(self, now: datetime = None) -> dict:
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=ARCHIVE_AFTER_DAYS)
+        with self.bind.begin() as conn:
+            project_ids = conn.scalars(
+                select(projects.c.id).where(
+                    projects.c.status.in_(FINISHED_PROJECT_STATUSES),
+                    projects.c.updated_at < cutoff,
+                ).limit(ARCHIVE_BATCH_SIZE)
+            ).all()
+            moved_requests = 0
+            if project_ids:
+                # Lignes dépendantes d'abord, pour les bases qui vérifient les clés étrangères
+                _move(conn, project_collaborators, project_collaborators_archive,
+                      project_collaborators.c.project_id.in_(project_ids), archived_at=now)
+                moved_requests += _move(conn, collaboration_requests, collaboration_requests_archive,
+                                        collaboration_requests.c.project_id.in_(project_ids), archived_at=now)
+                _move(conn, projects, projects_archive, projects.c.id.in_(project_ids), archived_at=now)
+
+            request_ids = conn.scalars(
+                select(collaboration_requests.c.id).where(
+                    collaboration_requests.c.status.in_(RESOLVED_REQUEST_STATUSES),
+                    collaboration_requests.c.updated_at < cutoff,
+                ).limit(ARCHIVE_BATCH_SIZE)
+            ).all()
+            if request_ids:
+                moved_requests += _move(conn, collaboration_requests, collaboration_requests_archive,
+                                        collaboration_requests.c.id.in_(request_ids), archived_at=now)
+        return {"projects": len(project_ids), "collaboration_requests": moved_requests}
+
+    async def run(self, interval: float = ARCHIVE_INTERVAL_SECONDS):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                while True:
+                    moved = await loop.run_in_executor(None, self.run_once)
+                    if max(moved.values()) < ARCHIVE_BATCH_SIZE:
+                        break
+            except Exception:
+                logger.exception("Échec de l'archivage")
+            await asyncio.sleep(interval)
+
+
+archive_job = ArchiveJob()
+
+
+# ==================== RESTAURATION ====================
+
+def restore_project(db: Session, project_id: int):
+    """Ramène un projet archivé, ses collaborateurs et ses demandes dans les
+    tables chaudes (dans la transaction de `db`). La date de modification est
+    remise à maintenant pour qu'il ne soit pas archivé au passage suivant."""
+    now = datetime.utcnow()
+    _move(db, projects_archive, projects, projects_archive.c.id == project_id, updated_at=now)
+    _move(db, project_collaborators_archive, project_collaborators,
+          project_collaborators_archive.c.project_id == project_id)
+    _move(db, collaboration_requests_archive, collaboration_requests,
+          collaboration_requests_archive.c.project_id == project_id)
+
+
+def restore_collaboration_request(db: Session, request_id: int):
+    _move(db, collaboration_requests_archive, collaboration_requests,
+          collaboration_requests_archive.c.id == request_id, updated_at=datetime.utcnow())
+
+
+# ==================== LECTURE ====================
+
+def _project_columns(row) -> dict:
+    return {column.name: row[column.name] for column in projects.columns}
+
+
+def archived_projects(db: Session, *conditions, limit: int = None) -> List[Project]:
+    """Projets archivés, sous forme d'objets Project transitoires (propriétaire
+    et collaborateurs chargés en deux requêtes, sérialisables par ProjectSchema)"""
+    query = select(projects_archive).where(*conditions).order_by(projects_archive.c.id)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = db.execute(query).mappings().all()
+    if not rows:
+        return []
+
+    collaborators = defaultdict(list)
+    for project_id, user_id in db.execute(
+        select(project_collaborators_archive.c.project_id, project_collaborators_archive.c.user_id)
+        .where(project_collaborators_archive.c.project_id.in_([row["id"] for row in rows]))
+    ):
+        collaborators[project_id].append(user_id)
+    user_ids = {row["owner_id"] for row in rows} | {u for ids in collaborators.values() for u in ids}
+    users = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids))}
+
+    result = []
+    for row in rows:
+        project = Project(**_project_columns(row))
+        set_committed_value(project, "owner", users.get(row["owner_id"]))
+        set_committed_value(project, "collaborators", [
+            users[user_id] for user_id in collaborators[row["id"]] if user_id in users
+        ])
+        result.append(project)
+    return result
+
+
+def archived_project(db: Session, project_id: int):
+    found = archived_projects(db, projects_archive.c.id == project_id)
+    return found[0] if found else None
+
+
+def projects_with_archive(db: Session, status: str = None, skip: int = 0, limit: int = 100) -> List[Project]:
+    """Projets chauds et archivés fusionnés par id, puis paginés"""
+    hot = db.query(Project)
+    conditions = []
+    if status:
+        hot = hot.filter(Project.status == status)
+        conditions.append(projects_archive.c.status == status)
+    hot = hot.order_by(Project.id).limit(skip + limit).all()
+    cold = archived_projects(db, *conditions, limit=skip + limit)
+    return list(heapq.merge(hot, cold, key=lambda project: project.id))[skip:skip + limit]
+
+
+def archived_collaboration_requests(db: Session, *conditions) -> List[CollaborationRequest]:
+    rows = db.execute(
+        select(collaboration_requests_archive).where(*conditions).order_by(collaboration_requests_archive.c.id)
+    ).mappings().all()
+    return [
+        CollaborationRequest(**{column.name: row[column.name] for column in collaboration_requests.columns})
+        for row in rows
+    ]
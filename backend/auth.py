@@ -1,32 +1,42 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 import os
-from dotenv import load_dotenv
 
+# Les variables d'environnement (.env) sont chargées par database.py
 from database import get_db, User
 from schemas import TokenData
 
-load_dotenv()
-
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context() -> CryptContext:
+    """Construit le contexte de hachage au premier usage plutôt qu'à l'import"""
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def warm_up_password_hashing():
+    # Charge et valide le backend bcrypt (sinon fait lors du premier login)
+    get_pwd_context().handler("bcrypt").get_backend()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -49,7 +59,7 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _user_from_token(token: str, db: Session):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -69,6 +79,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     return user
 
 
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    # Sous-requête de /api/batch : l'utilisateur a déjà été authentifié par le lot
+    principal = getattr(request.state, "user", None)
+    if principal is not None:
+        return principal
+    return _user_from_token(token, db)
+
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)):
+    if token is None:
+        return None
+    return _user_from_token(token, db)
+
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     return current_user
 
@@ -0,0 +1,272 @@
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import Skill, Language, User, user_skills, user_languages
+from invalidation import bus
+
+KINDS = ("skill", "language", "user")
+# Au-delà de ce nombre de clés, un préfixe n'est plus parcouru à chaque requête :
+# ses meilleures entrées sont mémorisées et tenues à jour
+SCAN_LIMIT = 512
+# Taille des listes mémorisées : le double de la limite maximale de l'API
+TOP_SIZE = 100
+MAX_CACHED_PREFIXES = 1024
+
+
+def normalize(text: str) -> str:
+    """Minuscules sans accents : « Équipe » -> « equipe »"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+
+def _terms(*labels) -> set:
+    # Le libellé complet et chacun de ses mots : « Machine Learning » répond à « lea »
+    terms = set()
+    for label in labels:
+        norm = normalize(label)
+        if norm:
+            terms.add(norm)
+            terms.update(w for w in re.split(r"[\s_\-.]+", norm) if w)
+    return terms
+
+
+class PrefixIndex:
+    """Tableau trié de (terme normalisé, id) interrogé par bisection.
+
+    Pour les préfixes courts, qui couvrent une large part du tableau, les
+    `TOP_SIZE` entrées les plus populaires sont mémorisées (LRU) et corrigées à
+    chaque modification d'une entrée concernée, au lieu d'un parcours complet."""
+
+    def __init__(self):
+        self._keys: List[tuple] = []
+        self._terms: Dict[int, set] = {}
+        self._top = OrderedDict()
+        self.labels: Dict[int, str] = {}
+        self.popularity: Dict[int, object] = {}
+
+    def load(self, entries):
+        """Chargement initial : les clés sont triées une seule fois"""
+        keys = []
+        for item_id, label, terms, popularity in entries:
+            self.labels[item_id] = label
+            self.popularity[item_id] = popularity
+            self._terms[item_id] = terms
+            keys.extend((term, item_id) for term in terms)
+        keys.sort()
+        self._keys = keys
+        self._top.clear()
+
+    def add(self, item_id: int, label: str, terms: set, popularity):
+        old_terms = self._terms.get(item_id, set())
+        for term in old_terms - terms:
+            self._remove_key(term, item_id)
+        for term in terms - old_terms:
+            insort(self._keys, (term, item_id))
+        self.labels[item_id] = label
+        self.popularity[item_id] = popularity
+        self._terms[item_id] = terms
+        self._update_top(item_id, old_terms | terms)
+
+    def remove(self, item_id: int):
+        terms = self._terms.pop(item_id, set())
+        for term in terms:
+            self._remove_key(term, item_id)
+        self.labels.pop(item_id, None)
+        self.popularity.pop(item_id, None)
+        self._update_top(item_id, terms)
+
+    def set_popularity(self, item_id: int, popularity):
+        if item_id in self.popularity:
+            self.popularity[item_id] = popularity
+            self._update_top(item_id, self._terms[item_id])
+
+    def _remove_key(self, term, item_id):
+        i = bisect_left(self._keys, (term, item_id))
+        if i < len(self._keys) and self._keys[i] == (term, item_id):
+            del self._keys[i]
+
+    def _score(self, item_id):
+        return self.popularity[item_id], -item_id
+
+    def _update_top(self, item_id: int, terms):
+        """Corrige les listes mémorisées des préfixes de `terms` après modification de l'entrée.
+
+        Invariant : toute entrée absente d'une liste est moins populaire que la
+        dernière de la liste. Une entrée qui descend sous ce seuil en sort ; la
+        liste raccourcit et sera recalculée si elle devient trop courte."""
+        if not self._top:
+            return
+        prefixes = {term[:n] for term in terms for n in range(1, len(term) + 1)} & self._top.keys()
+        current = self._terms.get(item_id, ())
+        for prefix in prefixes:
+            top = self._top[prefix]
+            if item_id in top:
+                top.remove(item_id)
+            if not top or not any(term.startswith(prefix) for term in current):
+                continue
+            score = self._score(item_id)
+            if score > self._score(top[-1]):
+                position = next(i for i, other in enumerate(top) if self._score(other) < score)
+                top.insert(position, item_id)
+                del top[TOP_SIZE:]
+
+    def _best(self, lo: int, hi: int, limit: int) -> List[int]:
+        matches = {item_id for _, item_id in self._keys[lo:hi]}
+        return heapq.nlargest(limit, matches, key=self._score)
+
+    def search(self, prefix: str, limit: int) -> List[int]:
+        lo = bisect_left(self._keys, (prefix,))
+        hi = bisect_left(self._keys, (prefix + "\U0010ffff",))
+        if hi - lo <= SCAN_LIMIT:
+            return self._best(lo, hi, limit)
+        top = self._top.get(prefix)
+        if top is None or len(top) < limit:
+            # Liste absente, ou raccourcie par des retraits : nouveau parcours de la plage
+            top = self._top[prefix] = self._best(lo, hi, TOP_SIZE)
+            if len(self._top) > MAX_CACHED_PREFIXES:
+                self._top.popitem(last=False)
+        else:
+            self._top.move_to_end(prefix)
+        return top[:limit]
+
+
+class Autocomplete:
+    """Index de complétion en mémoire pour les compétences, langues et personnes.
+
+    Chargé une fois depuis la base, puis tenu à jour par les routes qui créent
+    ou modifient ces entités : une requête de complétion ne touche pas la base.
+    Les autres workers reçoivent les entrées modifiées par le canal `autocomplete`."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._indexes = {kind: PrefixIndex() for kind in KINDS}
+
+    def load(self, db: Session):
+        skills = db.execute(
+            select(Skill.id, Skill.name, func.count(user_skills.c.user_id))
+            .outerjoin(user_skills, user_skills.c.skill_id == Skill.id)
+            .group_by(Skill.id)
+        ).all()
+        languages = db.execute(
+            select(Language.id, Language.name, Language.code, func.count(user_languages.c.user_id))
+            .outerjoin(user_languages, user_languages.c.language_id == Language.id)
+            .group_by(Language.id)
+        ).all()
+        users = db.execute(
+            select(User.id, User.username, User.full_name, User.is_verified,
+                   func.count(user_skills.c.skill_id))
+            .outerjoin(user_skills, user_skills.c.user_id == User.id)
+            .group_by(User.id)
+        ).all()
+
+        indexes = {kind: PrefixIndex() for kind in KINDS}
+        indexes["skill"].load(
+            (skill_id, name, _terms(name), count) for skill_id, name, count in skills
+        )
+        indexes["language"].load(
+            (language_id, name, _terms(name, code), count) for language_id, name, code, count in languages
+        )
+        indexes["user"].load(
+            (user_id, full_name or username, _terms(username, full_name), (bool(is_verified), count))
+            for user_id, username, full_name, is_verified, count in users
+        )
+
+        with self._lock:
+            self._indexes = indexes
+            self._loaded = True
+
+    def ensure_loaded(self, db: Session):
+        if not self._loaded:
+            self.load(db)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def search(self, db: Session, kind: str, q: str, limit: int = 10) -> List[dict]:
+        self.ensure_loaded(db)
+        prefix = normalize(q)
+        if not prefix:
+            return []
+        with self._lock:
+            index = self._indexes[kind]
+            return [
+                {"id": item_id, "kind": kind, "label": index.labels[item_id],
+                 "count": self._count(kind, index.popularity[item_id])}
+                for item_id in index.search(prefix, limit)
+            ]
+
+    @staticmethod
+    def _count(kind, popularity):
+        return popularity[1] if kind == "user" else popularity
+
+    # ---------- Mises à jour incrémentales ----------
+
+    def _update(self, kind, fn):
+        with self._lock:
+            if self._loaded:
+                fn(self._indexes[kind])
+
+    def add_skill(self, skill_id: int, name: str):
+        # Une compétence déjà connue garde son nombre d'utilisateurs
+        self._update("skill", lambda index: index.add(
+            skill_id, name, _terms(name), index.popularity.get(skill_id, 0)))
+
+    def add_language(self, language_id: int, name: str, code: Optional[str]):
+        self._update("language", lambda index: index.add(
+            language_id, name, _terms(name, code), index.popularity.get(language_id, 0)))
+
+    def add_user(self, user_id: int, username: str, full_name: Optional[str], verified: bool,
+                 skill_count: int):
+        self._update("user", lambda index: index.add(
+            user_id, full_name or username, _terms(username, full_name), (bool(verified), skill_count)))
+
+    def set_counts(self, kind, counts):
+        """Nombre d'utilisateurs de compétences ou langues : liste de paires (id, effectif)"""
+        def apply(index):
+            for item_id, count in counts:
+                index.set_popularity(item_id, count)
+
+        self._update(kind, apply)
+
+    def apply_event(self, payload: dict):
+        """Rejoue un événement `autocomplete` publié par un autre worker (valeurs absolues)"""
+        if "skill" in payload:
+            self.add_skill(payload["skill"]["id"], payload["skill"]["name"])
+        if "language" in payload:
+            language = payload["language"]
+            self.add_language(language["id"], language["name"], language["code"])
+        if "username" in payload:
+            self.add_user(payload["user_id"], payload["username"], payload["full_name"],
+                          payload["verified"], len(payload["skills"]))
+        for kind, counts in payload.get("counts", {}).items():
+            self.set_counts(kind, counts)
+
+
+def item_counts(db: Session, kind: str, item_ids) -> List[list]:
+    """Nombre d'utilisateurs des compétences ou langues données, lu dans la transaction courante.
+
+    Publiées avec l'événement, ces valeurs absolues peuvent être rejouées par les
+    autres workers sans dériver, contrairement à des incréments."""
+    item_ids = set(item_ids)
+    if not item_ids:
+        return []
+    column = user_skills.c.skill_id if kind == "skill" else user_languages.c.language_id
+    counts = dict(db.execute(
+        select(column, func.count()).where(column.in_(item_ids)).group_by(column)
+    ).all())
+    return [[item_id, counts.get(item_id, 0)] for item_id in sorted(item_ids)]
+
+
+autocomplete = Autocomplete()
+
+bus.subscribe("autocomplete", autocomplete.apply_event)
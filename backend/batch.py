@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import os
+from typing import List
+from urllib.parse import urlencode
+
+from fastapi.middleware.asyncexitstack import AsyncExitStackMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.exceptions import ExceptionMiddleware
+
+from database import SessionLocal
+from rate_limit import ROUTE_BUDGETS
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", 20))
+# Lectures d'un même lot exécutées en parallèle, chacune sur sa propre connexion
+BATCH_MAX_PARALLEL_READS = int(os.getenv("BATCH_MAX_PARALLEL_READS", 4))
+BATCH_PATH = "/api/batch"
+
+# En-têtes de la requête groupée transmis aux sous-requêtes
+_FORWARDED_HEADERS = (b"authorization", b"accept-language", b"user-agent")
+
+
+def check_item(method: str, path: str):
+    """Message d'erreur si la sous-requête n'est pas autorisée, sinon None"""
+    if method not in ("GET", "POST", "PUT", "DELETE"):
+        return "Méthode non autorisée"
+    if not path.startswith("/api/") or path.startswith(BATCH_PATH):
+        return "Chemin non autorisé"
+    # Les routes à budget dédié (connexion, inscription, recherche) restent hors lot
+    if (method, path) in ROUTE_BUDGETS:
+        return "Route non disponible en requête groupée"
+    return None
+
+
+def stages(items) -> List[List[int]]:
+    """Découpe le lot en étapes : les GET consécutifs sont lancés ensemble,
+    chaque écriture forme une étape seule, dans l'ordre du lot"""
+    result = []
+    for index, item in enumerate(items):
+        if item.method.upper() == "GET" and result and items[result[-1][0]].method.upper() == "GET":
+            result[-1].append(index)
+        else:
+            result.append([index])
+    return result
+
+
+class BatchDispatcher:
+    """Exécute des sous-requêtes sur les routes de l'application, sans repasser
+    par les middlewares HTTP (CORS, compression, limitation de débit).
+
+    La session et l'utilisateur du lot sont transmis par `request.state` :
+    `get_db` et `get_current_user` les réutilisent au lieu d'ouvrir une
+    session et de relire l'utilisateur à chaque sous-requête."""
+
+    def __init__(self, app):
+        self.app = app
+        self._stack = None
+
+    @property
+    def stack(self):
+        if self._stack is None:
+            self._stack = ExceptionMiddleware(
+                AsyncExitStackMiddleware(self.app.router),
+                handlers={
+                    key: handler for key, handler in self.app.exception_handlers.items()
+                    if key not in (500, Exception)
+                },
+                debug=self.app.debug,
+            )
+        return self._stack
+
+    async def run(self, request, items, db, user) -> List[dict]:
+        headers = [(k, v) for k, v in request.scope["headers"] if k in _FORWARDED_HEADERS]
+        results = [None] * len(items)
+        for stage in stages(items):
+            if len(stage) == 1:
+                index = stage[0]
+                results[index] = await self._call(request, items[index], headers, db, user)
+            else:
+                await self._read_stage(request, items, stage, headers, db, user, results)
+        return results
+
+    async def _read_stage(self, request, items, stage, headers, db, user, results):
+        """Lectures indépendantes en parallèle. Une Session n'étant pas partageable
+        entre threads, chaque lecture parallèle a la sienne (connexion du pool) et
+        une copie de l'utilisateur attachée sans SELECT. Chacune occupe une place
+        de l'admission globale, prise sans attendre : faute de place, la lecture
+        est exécutée à la suite des autres sur la session du lot."""
+        admission = request.scope.get("state", {}).get("admission")
+        parallel = []
+        for index in stage[1:BATCH_MAX_PARALLEL_READS]:
+            if admission is not None and not await admission.try_acquire():
+                break
+            parallel.append(index)
+        shared = [index for index in stage if index not in parallel]
+        sessions = [SessionLocal() for _ in parallel]
+
+        async def run_shared():
+            for index in shared:
+                results[index] = await self._call(request, items[index], headers, db, user)
+
+        async def run_parallel(index, session):
+            results[index] = await self._call(
+                request, items[index], headers, session,
+                session.merge(user, load=False) if user is not None else None
+            )
+
+        try:
+            await asyncio.gather(run_shared(), *[
+                run_parallel(index, session) for index, session in zip(parallel, sessions)
+            ])
+        finally:
+            for session in sessions:
+                session.close()
+            if admission is not None:
+                for _ in parallel:
+                    admission.release()
+
+    async def _call(self, request, item, headers, db, user) -> dict:
+        method = item.method.upper()
+        path, _, query = item.path.partition("?")
+        if item.query:
+            query = "&".join(filter(None, [query, urlencode(item.query, doseq=True)]))
+        error = check_item(method, path)
+        if error:
+            return {"id": item.id, "status": 400, "body": {"detail": error}}
+
+        body = b"" if item.body is None else json.dumps(item.body).encode()
+        item_headers = list(headers)
+        if item.body is not None:
+            item_headers += [(b"content-type", b"application/json"),
+                             (b"content-length", str(len(body)).encode())]
+        scope = {
+            **{k: v for k, v in request.scope.items()
+               if k in ("asgi", "http_version", "scheme", "server", "client", "root_path", "app")},
+            "type": "http",
+            "method": method,
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "headers": item_headers,
+            "state": {**request.scope.get("state", {}), "db": db, "user": user},
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        response = {"status": 500, "headers": [], "chunks": []}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                response["chunks"].append(message.get("body", b""))
+
+        try:
+            await self.stack(scope, receive, send)
+        except Exception:
+            logger.exception("Échec de la sous-requête %s %s", method, path)
+            await run_in_threadpool(db.rollback)
+            return {"id": item.id, "status": 500, "body": {"detail": "Erreur interne"}}
+
+        raw = b"".join(response["chunks"])
+        content_type = dict(response["headers"]).get(b"content-type", b"")
+        if not raw:
+            payload = None
+        elif content_type.startswith(b"application/json"):
+            payload = json.loads(raw)
+        else:
+            payload = raw.decode("utf-8", "replace")
+        return {"id": item.id, "status": response["status"], "body": payload}
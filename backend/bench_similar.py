@@ -0,0 +1,65 @@
+"""Rappel et latence de l'index MinHash/LSH comparés à la recherche exhaustive.
+
+    python bench_similar.py --users 100000 --queries 200 --k 10
+
+Les profils sont synthétiques : chaque utilisateur dérive d'un profil type
+(compétences et langues) avec du bruit, comme des promotions ou des métiers."""
+import argparse
+import random
+import statistics
+import time
+
+from similarity import MinHashLSH, user_tokens
+
+
+def synthetic_profiles(n_users, n_skills=800, n_languages=25, n_archetypes=400, seed=7):
+    rng = random.Random(seed)
+    archetypes = [
+        (rng.sample(range(n_skills), rng.randint(5, 10)), rng.sample(range(n_languages), rng.randint(1, 3)))
+        for _ in range(n_archetypes)
+    ]
+    for user_id in range(n_users):
+        skills, languages = rng.choice(archetypes)
+        skills = [s for s in skills if rng.random() > 0.15] + rng.sample(range(n_skills), rng.randint(0, 2))
+        yield user_id, user_tokens(skills, languages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    index = MinHashLSH()
+    start = time.perf_counter()
+    for user_id, tokens in synthetic_profiles(args.users):
+        index.set(user_id, tokens)
+    print(f"indexation de {args.users} profils : {time.perf_counter() - start:.1f} s")
+
+    rng = random.Random(1)
+    recalls, lsh_ms, brute_ms = [], [], []
+    for user_id in rng.sample(range(args.users), args.queries):
+        tokens = index.tokens(user_id)
+
+        start = time.perf_counter()
+        approx = index.query(tokens, args.k, exclude=user_id)
+        lsh_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        exact = index.brute_force(tokens, args.k, exclude=user_id)
+        brute_ms.append((time.perf_counter() - start) * 1000)
+
+        # Rappel sur les scores : les ex æquo au k-ième rang sont interchangeables
+        if exact:
+            threshold = exact[-1][1]
+            found = sum(1 for _, score in approx if score >= threshold)
+            recalls.append(min(found, len(exact)) / len(exact))
+
+    print(f"rappel@{args.k} moyen : {statistics.mean(recalls):.3f}")
+    print(f"LSH        : médiane {statistics.median(lsh_ms):.2f} ms, p95 {sorted(lsh_ms)[int(len(lsh_ms) * 0.95)]:.2f} ms")
+    print(f"exhaustive : médiane {statistics.median(brute_ms):.2f} ms, p95 {sorted(brute_ms)[int(len(brute_ms) * 0.95)]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Mesure le démarrage à froid de l'API (import de main + événements startup).
+
+    python bench_startup.py --runs 5 --max-ms 1500
+
+Chaque mesure est faite dans un processus neuf. Le script se termine avec le
+code 1 si la médiane dépasse le budget, ce qui permet de l'utiliser en CI."""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = """
+import asyncio, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def startup():
+    # Protocole ASGI lifespan : on attend la fin des événements startup,
+    # puis l'arrêt est demandé normalement (tâches de fond annulées par l'app)
+    started = asyncio.Event()
+    stopping = asyncio.Event()
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+
+    async def receive():
+        message = next(messages)
+        if message["type"] == "lifespan.shutdown":
+            await stopping.wait()
+        return message
+
+    async def send(message):
+        if message["type"].startswith("lifespan.startup"):
+            started.set()
+
+    lifespan = asyncio.create_task(main.app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+    await started.wait()
+    ready = time.perf_counter()
+    stopping.set()
+    await lifespan
+    return ready
+
+end = asyncio.run(startup())
+print(f"{(imported - start) * 1000:.1f} {(end - start) * 1000:.1f}")
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", 1500)))
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'startup.db')}",
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench"),
+        WARMUP_ENABLED="false",
+    )
+    try:
+        # Premier lancement : création du schéma, non comptée
+        subprocess.run([sys.executable, "-c", PROBE], cwd=HERE, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        imports, totals = [], []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, "-c", PROBE], cwd=HERE, env=env, check=True,
+                                 capture_output=True, text=True).stdout.split()
+            imports.append(float(out[0]))
+            totals.append(float(out[1]))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    total = statistics.median(totals)
+    print(f"import : {statistics.median(imports):.1f} ms (médiane)")
+    print(f"import + startup : {total:.1f} ms (médiane), budget {args.max_ms:.0f} ms")
+    if total > args.max_ms:
+        print("Budget de démarrage dépassé", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
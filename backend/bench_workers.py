@@ -0,0 +1,117 @@
+"""Mesure le débit de l'API selon le nombre de workers gunicorn.
+
+    python bench_workers.py --workers 1 2 4 --duration 10
+
+Chaque configuration est lancée sur une base SQLite temporaire peuplée par
+seed_data.py, puis chargée par des processus clients en parallèle.
+
+La configuration mesurée est celle de gunicorn.conf.py : limiteur de débit actif,
+budgets par route dans la base et budget par défaut en mémoire de chaque worker.
+Seul le budget par défaut est relevé pour que les clients du benchmark, tous sur
+la même IP, ne reçoivent pas de 429 ; `--no-rate-limit` mesure le débit sans
+limiteur, pour comparaison."""
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _client(url, deadline, counter, rejected):
+    done = refused = 0
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            done += 1
+        except urllib.error.HTTPError as error:
+            error.read()
+            refused += 1
+    with counter.get_lock():
+        counter.value += done
+    with rejected.get_lock():
+        rejected.value += refused
+
+
+def _wait_ready(url, timeout=30):
+    start = time.time()
+    while time.time() - start < timeout:
+        try:
+            urllib.request.urlopen(url).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Le serveur n'a pas démarré")
+
+
+def run(workers, duration, clients, path, port, env):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py",
+         "--workers", str(workers), "--bind", f"127.0.0.1:{port}"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}{path}"
+    try:
+        _wait_ready(url)
+        counter = multiprocessing.Value("i", 0)
+        rejected = multiprocessing.Value("i", 0)
+        deadline = time.time() + duration
+        procs = [
+            multiprocessing.Process(target=_client, args=(url, deadline, counter, rejected))
+            for _ in range(clients)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        return counter.value / duration, rejected.value
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=multiprocessing.cpu_count() * 2)
+    parser.add_argument("--path", default="/api/talent-map")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="désactive le limiteur de débit (configuration non déployée)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench"),
+        RATE_LIMIT_ENABLED="false" if args.no_rate_limit else "true",
+        RATE_LIMIT_DEFAULT_PER_MINUTE="10000000",
+        RATE_LIMIT_DEFAULT_BURST="10000000",
+    )
+    try:
+        subprocess.run([sys.executable, "seed_data.py"], cwd=HERE, env=env,
+                       check=True, stdout=subprocess.DEVNULL)
+        baseline = None
+        limiter = ("désactivé" if args.no_rate_limit else
+                   f"budgets par route : {env.get('RATE_LIMIT_BACKEND', 'database')}, budget par défaut : mémoire")
+        print(f"Limiteur de débit : {limiter} ; {multiprocessing.cpu_count()} cœur(s)")
+        print(f"{'workers':>8} {'req/s':>10} {'accélération':>13} {'refusées':>9}")
+        for workers in args.workers:
+            rps, rejected = run(workers, args.duration, args.clients, args.path, args.port, env)
+            baseline = baseline or rps / workers
+            print(f"{workers:>8} {rps:>10.1f} {rps / baseline:>12.2f}x {rejected:>9}")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Inscriptions concurrentes : exactitude et débit du chemin d'écriture.
+
+    python bench_writes.py --threads 8 --users 200 --duplicates 4
+
+Chaque nom d'utilisateur est soumis `--duplicates` fois en parallèle : une seule
+inscription doit réussir (201), les autres doivent recevoir 400, jamais 500."""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--duplicates", type=int, default=4)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'writes.db')}",
+        SECRET_KEY=os.getenv("SECRET_KEY", "bench"),
+        RATE_LIMIT_ENABLED="false",
+        WARMUP_ENABLED="false",
+    )
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from fastapi.testclient import TestClient
+    import auth
+    import main as api
+
+    # Le coût de bcrypt masquerait celui des allers-retours SQL
+    auth.get_password_hash = api.get_password_hash = lambda password: "bench"
+
+    payloads = [
+        {"email": f"user{i}@bench.fr", "username": f"user{i}", "password": "x"}
+        for i in range(args.users) for _ in range(args.duplicates)
+    ]
+    with TestClient(api.app) as client:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            statuses = list(pool.map(lambda p: client.post("/api/register", json=p).status_code, payloads))
+        elapsed = time.perf_counter() - start
+
+    counts = Counter(statuses)
+    print(f"{len(payloads)} requêtes en {elapsed:.2f} s ({len(payloads) / elapsed:.0f} req/s)")
+    print("statuts :", dict(counts))
+    ok = counts[201] == args.users and counts[400] == len(payloads) - args.users
+    print("exact" if ok else "INCORRECT")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import threading
+from typing import Dict, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import Skill, Language
+from invalidation import bus
+
+_MODELS = {"skill": Skill, "language": Language}
+
+
+class CatalogIds:
+    """Ensembles des ids de compétences et de langues existants, gardés en mémoire
+    pour valider les mises à jour de profil sans requête supplémentaire"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, Set[int]] = {}
+
+    def get(self, db: Session, kind: str) -> Set[int]:
+        ids = self._ids.get(kind)
+        if ids is None:
+            ids = set(db.scalars(select(_MODELS[kind].id)))
+            with self._lock:
+                self._ids[kind] = ids
+        return ids
+
+    def existing(self, db: Session, kind: str, item_ids) -> Set[int]:
+        """Ids de `item_ids` présents dans le catalogue. Les ids absents de
+        l'ensemble en mémoire (créés par un autre worker pas encore signalé,
+        ou hors de l'API) sont vérifiés en base, puis ajoutés à l'ensemble"""
+        known = self.get(db, kind)
+        item_ids = set(item_ids)
+        unknown = item_ids - known
+        if not unknown:
+            return item_ids
+        model = _MODELS[kind]
+        found = set(db.scalars(select(model.id).where(model.id.in_(unknown))))
+        if found:
+            with self._lock:
+                if kind in self._ids:
+                    self._ids[kind] = self._ids[kind] | found
+        return (item_ids - unknown) | found
+
+    def add(self, kind: str, item_id: int):
+        with self._lock:
+            if kind in self._ids:
+                self._ids[kind] = self._ids[kind] | {item_id}
+
+    def invalidate(self):
+        with self._lock:
+            self._ids.clear()
+
+
+catalog_ids = CatalogIds()
+
+bus.subscribe("catalog", lambda payload: catalog_ids.invalidate())
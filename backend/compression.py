@@ -0,0 +1,265 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+# brotli et zstandard sont facultatifs : sans eux, l'encodage correspondant n'est pas proposé
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+# Taille totale maximale des corps compressés gardés en cache
+COMPRESSION_CACHE_BYTES = int(os.getenv("COMPRESSION_CACHE_BYTES", 8 * 1024 * 1024))
+# Au-delà, la compression est faite dans le pool de threads pour ne pas bloquer la boucle
+THREADPOOL_THRESHOLD = 256 * 1024
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml")
+
+
+# ==================== ENCODAGES ====================
+
+def _gzip_stream():
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return (lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush)
+
+
+def _brotli_stream():
+    compressor = brotli.Compressor(quality=5)
+    return (lambda data: compressor.process(data) + compressor.flush(), compressor.finish)
+
+
+def _zstd_stream():
+    compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    return (lambda data: compressor.compress(data) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush)
+
+
+# Par ordre de préférence du serveur à qualité égale
+ENCODINGS = OrderedDict()
+if brotli is not None:
+    ENCODINGS["br"] = (lambda body: brotli.compress(body, quality=5), _brotli_stream)
+if zstandard is not None:
+    ENCODINGS["zstd"] = (lambda body: zstandard.ZstdCompressor(level=3).compress(body), _zstd_stream)
+ENCODINGS["gzip"] = (lambda body: gzip.compress(body, compresslevel=6, mtime=0), _gzip_stream)
+
+
+def negotiate(accept_encoding: str):
+    """Encodage retenu d'après Accept-Encoding (avec q-values), ou None"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+# ==================== STATISTIQUES ====================
+
+class CompressionStats:
+    """Taux de compression et temps CPU cumulés par route"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route, encoding, size_in, size_out, cpu_seconds, cached=False):
+        with self._lock:
+            entry = self._routes.setdefault(route, {
+                "responses": 0, "cache_hits": 0, "bytes_in": 0, "bytes_out": 0,
+                "cpu_ms": 0.0, "encodings": {}
+            })
+            entry["responses"] += 1
+            entry["cache_hits"] += int(cached)
+            entry["bytes_in"] += size_in
+            entry["bytes_out"] += size_out
+            entry["cpu_ms"] += cpu_seconds * 1000
+            entry["encodings"][encoding] = entry["encodings"].get(encoding, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                route: {
+                    **entry,
+                    "encodings": dict(entry["encodings"]),
+                    "cpu_ms": round(entry["cpu_ms"], 3),
+                    "ratio": round(entry["bytes_in"] / entry["bytes_out"], 2) if entry["bytes_out"] else None,
+                }
+                for route, entry in self._routes.items()
+            }
+
+
+compression_stats = CompressionStats()
+
+
+# ==================== CACHE ====================
+
+class CompressedCache:
+    """LRU des corps compressés, indexé par (encodage, empreinte du corps) :
+    une même réponse n'est compressée qu'une fois"""
+
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value: bytes):
+        if len(value) > self.max_bytes // 4:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+# ==================== MIDDLEWARE ====================
+
+def _route_name(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", "")
+
+
+def _compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+
+class CompressionMiddleware:
+    """Compression br/zstd/gzip négociée, avec seuil de taille, cache des corps
+    compressés et compression en flux des réponses en plusieurs morceaux"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 cache: CompressedCache = None, stats: CompressionStats = compression_stats):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache or CompressedCache()
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        responder = _Responder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def compress(self, encoding: str, body: bytes, route: str) -> bytes:
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        compressed = self.cache.get(key)
+        if compressed is not None:
+            self.stats.record(route, encoding, len(body), len(compressed), 0.0, cached=True)
+            return compressed
+        start = time.thread_time()
+        compressed = ENCODINGS[encoding][0](body)
+        self.stats.record(route, encoding, len(body), len(compressed), time.thread_time() - start)
+        self.cache.put(key, compressed)
+        return compressed
+
+
+class _Responder:
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding, send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self.send_next = send
+        self.start_message = None
+        self.passthrough = False
+        self.stream = None
+        self.size_in = self.size_out = 0
+        self.cpu = 0.0
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            return await self.send_next(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            if not _compressible(headers) or (not more_body and len(body) < self.middleware.minimum_size):
+                self.passthrough = True
+                await self.send_next(start)
+                return await self.send_next(message)
+
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body:
+                # Corps complet : compression unique, mise en cache
+                route = _route_name(self.scope)
+                if len(body) > THREADPOOL_THRESHOLD:
+                    compressed = await run_in_threadpool(self.middleware.compress, self.encoding, body, route)
+                else:
+                    compressed = self.middleware.compress(self.encoding, body, route)
+                headers["Content-Length"] = str(len(compressed))
+                await self.send_next(start)
+                return await self.send_next({"type": "http.response.body", "body": compressed})
+
+            # Réponse en flux : chaque morceau est compressé et vidé au fil de l'eau
+            del headers["Content-Length"]
+            self.stream = ENCODINGS[self.encoding][1]()
+            await self.send_next(start)
+
+        if self.passthrough:
+            return await self.send_next(message)
+
+        start = time.thread_time()
+        compress, finish = self.stream
+        chunk = compress(body) if body else b""
+        if not more_body:
+            chunk += finish()
+        self.cpu += time.thread_time() - start
+        self.size_in += len(body)
+        self.size_out += len(chunk)
+        if not more_body:
+            self.middleware.stats.record(
+                _route_name(self.scope), self.encoding, self.size_in, self.size_out, self.cpu
+            )
+        await self.send_next({"type": "http.response.body", "body": chunk, "more_body": more_body})
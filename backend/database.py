@@ -1,10 +1,21 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, Table, ForeignKey
+from sqlalchemy import (
+    create_engine, event, inspect, insert, select, update, delete, func, Column, Integer, String,
+    Boolean, Date, DateTime, Text, Table, ForeignKey, Float, Index
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.schema import CreateTable
 from datetime import datetime
+from fastapi import Request
+from collections import Counter
+import hashlib
 import os
 from dotenv import load_dotenv
 
+from geo import geohash_for
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./talents.db")
@@ -12,24 +23,50 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./talents.db")
 engine = create_engine(
     DATABASE_URL, connect_args={"check_same_thread": False}
 )
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL : lecteurs et écrivain concurrents entre plusieurs workers ;
+        # busy_timeout : attendre le verrou d'écriture au lieu d'échouer
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-# Table d'association pour les compétences
-user_skills = Table(
-    'user_skills',
-    Base.metadata,
-    Column('user_id', Integer, ForeignKey('users.id')),
-    Column('skill_id', Integer, ForeignKey('skills.id'))
-)
+# Niveaux de maîtrise d'une compétence : 1 (débutant) à 5 (expert)
+SKILL_LEVELS = range(1, 6)
+
+
+# Association utilisateur-compétence, avec niveau, expérience et recommandations
+class UserSkill(Base):
+    __tablename__ = "user_skills"
+    # Recherche par niveau minimal : parcours de plage sur (skill_id, level),
+    # index couvrant pour les histogrammes de niveaux
+    __table_args__ = (Index('ix_user_skills_skill_level_user', 'skill_id', 'level', 'user_id'),)
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    skill_id = Column(Integer, ForeignKey('skills.id'), primary_key=True)
+    level = Column(Integer, nullable=False, default=1, server_default="1")
+    years_experience = Column(Float, nullable=False, default=0, server_default="0")
+    endorsement_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+# Vue table de l'association, utilisée par les requêtes Core existantes
+user_skills = UserSkill.__table__
 
 # Table d'association pour les langues
 user_languages = Table(
     'user_languages',
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id')),
-    Column('language_id', Integer, ForeignKey('languages.id'))
+    Column('language_id', Integer, ForeignKey('languages.id')),
+    # Effectifs par langue, relus à chaque modification de profil
+    Index('ix_user_languages_language_id', 'language_id')
 )
 
 # Table d'association pour les projets collaboratifs
@@ -40,6 +77,68 @@ project_collaborators = Table(
     Column('user_id', Integer, ForeignKey('users.id'))
 )
 
+# Seaux du limiteur de débit partagé entre processus (voir rate_limit.py)
+rate_limit_buckets = Table(
+    'rate_limit_buckets',
+    Base.metadata,
+    Column('key', String, primary_key=True),
+    Column('tokens', Float, nullable=False),
+    Column('updated_at', Float, nullable=False)
+)
+
+# Canal d'invalidation entre processus (voir invalidation.py)
+cache_events = Table(
+    'cache_events',
+    Base.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('channel', String, nullable=False),
+    Column('origin', String, nullable=False),
+    Column('payload', Text),
+    Column('created_at', Float, nullable=False)
+)
+
+# Journal des changements alimentant les agrégats historiques (voir history.py)
+talent_events = Table(
+    'talent_events',
+    Base.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('metric', String, nullable=False),  # users, verified_users, skill:<id>, language:<id>, projects:<statut>
+    Column('delta', Integer, nullable=False),
+    Column('occurred_at', DateTime, nullable=False, default=datetime.utcnow),
+    # Les événements repliés sont supprimés : AUTOINCREMENT garantit que les
+    # nouveaux ids restent au-delà du curseur de l'agrégation
+    sqlite_autoincrement=True
+)
+
+# Variations agrégées par jour, semaine et mois ; la clé primaire sert d'index
+# pour les lectures par plage (granularité, métrique, période)
+talent_rollups = Table(
+    'talent_rollups',
+    Base.metadata,
+    Column('granularity', String, primary_key=True),  # day, week, month
+    Column('metric', String, primary_key=True),
+    Column('period_start', Date, primary_key=True),
+    Column('delta', Integer, nullable=False)
+)
+
+# Position des traitements incrémentaux (dernier événement traité)
+job_cursors = Table(
+    'job_cursors',
+    Base.metadata,
+    Column('name', String, primary_key=True),
+    Column('last_id', Integer, nullable=False)
+)
+
+# Nombre d'utilisateurs par (compétence, niveau), tenu à jour à chaque écriture
+# de user_skills : l'histogramme des niveaux ne parcourt pas l'association
+skill_level_counts = Table(
+    'skill_level_counts',
+    Base.metadata,
+    Column('skill_id', Integer, primary_key=True),
+    Column('level', Integer, primary_key=True),
+    Column('count', Integer, nullable=False)
+)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -51,6 +150,10 @@ class User(Base):
     full_name = Column(String)
     bio = Column(Text)
     avatar_url = Column(String)
+    location = Column(String)  # Campus ou ville
+    latitude = Column(Float)
+    longitude = Column(Float)
+    geohash = Column(String, index=True)  # Calculé depuis latitude/longitude
     is_verified = Column(Boolean, default=False)
     verified_by_id = Column(Integer, ForeignKey('users.id'), nullable=True)
     is_admin = Column(Boolean, default=False)
@@ -59,6 +162,7 @@ class User(Base):
 
     # Relations
     skills = relationship("Skill", secondary=user_skills, back_populates="users")
+    skill_levels = relationship("UserSkill", viewonly=True)
     languages = relationship("Language", secondary=user_languages, back_populates="users")
     projects = relationship("Project", back_populates="owner")
     collaborations = relationship("Project", secondary=project_collaborators, back_populates="collaborators")
@@ -92,11 +196,17 @@ class Language(Base):
 
 class Project(Base):
     __tablename__ = "projects"
+    # AUTOINCREMENT : un id n'est jamais réattribué, même après archivage ou suppression
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     description = Column(Text)
     status = Column(String, default="en_cours")  # en_cours, termine, recherche_collaborateurs
+    location = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    geohash = Column(String, index=True)
     owner_id = Column(Integer, ForeignKey('users.id'))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -108,6 +218,7 @@ class Project(Base):
 
 class CollaborationRequest(Base):
     __tablename__ = "collaboration_requests"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey('projects.id'))
@@ -118,7 +229,105 @@ class CollaborationRequest(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
-def get_db():
+# ==================== ARCHIVES ====================
+
+def _archive_table(source: Table, name: str, *extra):
+    """Table froide de même structure que `source` (sans clés étrangères ni index),
+    plus la date d'archivage"""
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+        for column in source.columns
+    ]
+    return Table(name, Base.metadata, *columns, Column('archived_at', DateTime, nullable=False), *extra)
+
+
+# Projets terminés et demandes de collaboration traitées, déplacés par archive.py
+projects_archive = _archive_table(Project.__table__, 'projects_archive')
+project_collaborators_archive = _archive_table(
+    project_collaborators, 'project_collaborators_archive',
+    Index('ix_project_collaborators_archive_project_id', 'project_id')
+)
+collaboration_requests_archive = _archive_table(
+    CollaborationRequest.__table__, 'collaboration_requests_archive',
+    Index('ix_collaboration_requests_archive_project_id', 'project_id')
+)
+
+
+def _set_geohash(mapper, connection, target):
+    target.geohash = geohash_for(target.latitude, target.longitude)
+
+
+for _model in (User, Project):
+    event.listen(_model, "before_insert", _set_geohash)
+    event.listen(_model, "before_update", _set_geohash)
+
+
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def insert_returning(db, model, **values):
+    """INSERT ... ON CONFLICT DO NOTHING RETURNING en un seul aller-retour.
+
+    Retourne la ligne insérée (mapping de colonnes), ou None si une contrainte
+    d'unicité est violée. Les événements ORM (before_insert) ne sont pas déclenchés."""
+    columns = model.__table__.columns
+    dialect_insert = UPSERT_INSERTS.get(db.bind.dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(model.__table__).values(**values).on_conflict_do_nothing()
+        return db.execute(stmt.returning(*columns)).mappings().first()
+
+    try:
+        with db.begin_nested():
+            return db.execute(insert(model.__table__).values(**values).returning(*columns)).mappings().first()
+    except IntegrityError:
+        return None
+
+
+def apply_skill_level_changes(db, old_pairs, new_pairs):
+    """Reporte dans `skill_level_counts` le passage des (compétence, niveau) d'un
+    utilisateur de `old_pairs` à `new_pairs`, dans la transaction de `db`"""
+    deltas = Counter(new_pairs)
+    deltas.subtract(Counter(old_pairs))
+    rows = [{"skill_id": s, "level": l, "count": d} for (s, l), d in deltas.items() if d]
+    if not rows:
+        return
+    dialect_insert = UPSERT_INSERTS.get(db.bind.dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(skill_level_counts)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["skill_id", "level"],
+            set_={"count": skill_level_counts.c.count + stmt.excluded.count}
+        ), rows)
+        return
+    for row in rows:
+        key = (skill_level_counts.c.skill_id == row["skill_id"]) & (skill_level_counts.c.level == row["level"])
+        if db.execute(update(skill_level_counts).where(key)
+                      .values(count=skill_level_counts.c.count + row["count"])).rowcount == 0:
+            db.execute(insert(skill_level_counts).values(**row))
+
+
+def rebuild_skill_level_counts(conn):
+    """Recalcule `skill_level_counts` depuis user_skills (premier démarrage,
+    données insérées hors de l'API comme seed_data.py)"""
+    conn.execute(delete(skill_level_counts))
+    conn.execute(insert(skill_level_counts).from_select(
+        ["skill_id", "level", "count"],
+        select(user_skills.c.skill_id, user_skills.c.level, func.count())
+        .group_by(user_skills.c.skill_id, user_skills.c.level)
+    ))
+
+
+def _init_skill_level_counts(conn):
+    if conn.execute(select(skill_level_counts.c.skill_id).limit(1)).first() is None:
+        rebuild_skill_level_counts(conn)
+
+
+def get_db(request: Request):
+    # Sous-requête de /api/batch : la session du lot est réutilisée (et fermée par le lot)
+    shared = getattr(request.state, "db", None)
+    if shared is not None:
+        yield shared
+        return
     db = SessionLocal()
     try:
         yield db
@@ -126,5 +335,89 @@ def get_db():
         db.close()
 
 
+def schema_version() -> int:
+    """Empreinte des modèles (tables, colonnes, index), stockée dans PRAGMA user_version"""
+    description = ";".join(
+        f"{table.name}:{','.join(sorted(c.name for c in table.columns))}"
+        f":{','.join(sorted(i.name or '' for i in table.indexes))}"
+        f"{':autoincrement' if table.kwargs.get('sqlite_autoincrement') else ''}"
+        for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name)
+    )
+    return int(hashlib.sha1(description.encode()).hexdigest()[:7], 16)
+
+
 def init_db():
+    # Sous SQLite, create_all (une introspection par table) est sauté si le schéma
+    # enregistré correspond déjà aux modèles
+    if engine.dialect.name != "sqlite":
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            _init_skill_level_counts(conn)
+        return
+
+    version = schema_version()
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() == version:
+            return
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _add_missing_columns(conn)
+        _add_autoincrement(conn)
+        _init_skill_level_counts(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+
+
+def _add_missing_columns(conn):
+    """Ajoute aux tables existantes les colonnes et index apparus dans les modèles"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+# Tables froides dont les ids doivent rester réservés dans la table chaude
+_ARCHIVED_IDS = {"projects": "projects_archive", "collaboration_requests": "collaboration_requests_archive"}
+
+
+def _add_autoincrement(conn):
+    """Reconstruit les tables créées sans AUTOINCREMENT (bases antérieures) :
+    nouvelle table, copie, remplacement. La séquence part du plus grand id,
+    archives comprises. Les clés étrangères ne sont pas vérifiées par SQLite
+    ici (PRAGMA foreign_keys désactivé), le remplacement est donc sûr."""
+    for table in Base.metadata.sorted_tables:
+        if not table.kwargs.get("sqlite_autoincrement"):
+            continue
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar()
+        if "AUTOINCREMENT" not in sql.upper():
+            columns = ", ".join(column.name for column in table.columns)
+            ddl = str(CreateTable(table).compile(dialect=conn.dialect)).replace(
+                f"CREATE TABLE {table.name} (", f"CREATE TABLE {table.name}_rebuild (", 1
+            )
+            conn.exec_driver_sql(ddl)
+            conn.exec_driver_sql(
+                f"INSERT INTO {table.name}_rebuild ({columns}) SELECT {columns} FROM {table.name}"
+            )
+            conn.exec_driver_sql(f"DROP TABLE {table.name}")
+            conn.exec_driver_sql(f"ALTER TABLE {table.name}_rebuild RENAME TO {table.name}")
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+        archive = _ARCHIVED_IDS.get(table.name)
+        if archive is not None:
+            archived_max = conn.exec_driver_sql(f"SELECT COALESCE(MAX(id), 0) FROM {archive}").scalar()
+            conn.exec_driver_sql(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (archived_max, table.name)
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (table.name, archived_max, table.name)
+            )
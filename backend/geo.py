@@ -0,0 +1,91 @@
+from typing import Optional, Set, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Précision stockée en base (cellules d'environ 5 m)
+GEOHASH_PRECISION = 9
+# Nombre maximal de plages de géohash interrogées pour une emprise
+MAX_TILES = 32
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, rng = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            rng[0] = mid
+        else:
+            bits = bits * 2
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_for(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    return encode(latitude, longitude)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(hauteur en latitude, largeur en longitude) d'une cellule, en degrés"""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def precision_for_zoom(zoom: int) -> int:
+    """Précision des groupes pour un niveau de zoom de carte (0 = monde entier)"""
+    for max_zoom, precision in ((2, 1), (5, 2), (7, 3), (10, 4), (12, 5), (14, 6)):
+        if zoom <= max_zoom:
+            return precision
+    return 7
+
+
+def covering_cells(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                   precision: int) -> Set[str]:
+    """Géohashs de la précision donnée qui recouvrent l'emprise"""
+    height, width = cell_size(precision)
+
+    def steps(start, stop, step):
+        values = []
+        value = start
+        while value < stop:
+            values.append(value)
+            value += step
+        values.append(stop)
+        return values
+
+    return {
+        encode(lat, lon, precision)
+        for lat in steps(min_lat, max_lat, height)
+        for lon in steps(min_lon, max_lon, width)
+    }
+
+
+def query_cells(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                precision: int) -> Set[str]:
+    """Recouvrement le plus fin possible sans dépasser MAX_TILES plages"""
+    while precision > 1:
+        height, width = cell_size(precision)
+        estimate = ((max_lat - min_lat) / height + 2) * ((max_lon - min_lon) / width + 2)
+        if estimate <= MAX_TILES * 4:
+            cells = covering_cells(min_lat, min_lon, max_lat, max_lon, precision)
+            if len(cells) <= MAX_TILES:
+                return cells
+        precision -= 1
+    return covering_cells(min_lat, min_lon, max_lat, max_lon, 1)
+
+
+def prefix_range(prefix: str) -> Tuple[str, str]:
+    """Bornes [début, fin) des géohashs commençant par `prefix` ('{' suit 'z')"""
+    return prefix, prefix + "{"
@@ -0,0 +1,28 @@
+# Configuration gunicorn pour le mode multi-workers :
+#   gunicorn main:app -c gunicorn.conf.py
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", 30))
+graceful_timeout = 10
+keepalive = 5
+
+# Budgets par route (connexion, inscription, recherche) partagés via la base ;
+# le budget par défaut est réparti entre les workers (rate_limit.py)
+os.environ.setdefault("RATE_LIMIT_BACKEND", "database")
+
+
+def on_starting(server):
+    """Crée le schéma une seule fois, dans le maître, avant le fork des workers"""
+    from database import engine, init_db
+
+    # Nombre effectif de workers (option --workers comprise), lu par rate_limit.py
+    os.environ["WEB_CONCURRENCY"] = str(server.cfg.workers)
+
+    init_db()
+    # Les connexions SQLite ne doivent pas être héritées par les processus fils
+    engine.dispose()
+    os.environ["SKIP_INIT_DB"] = "1"
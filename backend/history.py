@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterable, Tuple
+
+from sqlalchemy import func, insert, select, update, delete
+from sqlalchemy.orm import Session
+
+from database import (
+    engine, UPSERT_INSERTS, talent_events, talent_rollups, job_cursors,
+    User, Project, user_skills, user_languages
+)
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("day", "week", "month")
+ROLLUP_INTERVAL_SECONDS = float(os.getenv("ROLLUP_INTERVAL_SECONDS", 60))
+ROLLUP_BATCH_SIZE = 5000
+MAX_POINTS = 2000
+JOB_NAME = "talent_rollups"
+
+
+# ==================== PÉRIODES ====================
+
+def period_start(moment, granularity: str) -> date:
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+# ==================== ÉVÉNEMENTS ====================
+
+def record(db: Session, changes: Iterable[Tuple[str, int]]):
+    """Ajoute des événements (métrique, variation) à la transaction en cours"""
+    now = datetime.utcnow()
+    rows = [{"metric": metric, "delta": delta, "occurred_at": now} for metric, delta in changes if delta]
+    if rows:
+        db.execute(insert(talent_events), rows)
+
+
+def association_changes(prefix: str, old_ids, new_ids):
+    old_ids, new_ids = set(old_ids), set(new_ids)
+    return ([(f"{prefix}:{i}", -1) for i in old_ids - new_ids]
+            + [(f"{prefix}:{i}", 1) for i in new_ids - old_ids])
+
+
+def _backfill(conn):
+    """Premier passage : l'état actuel est converti en événements datés
+    (date d'inscription pour les utilisateurs et leurs compétences/langues,
+    date de création pour les projets). Les événements déjà journalisés sont
+    inclus dans cet état et donc supprimés."""
+    conn.execute(delete(talent_events))
+    now = datetime.utcnow()
+    rows = []
+    joined = {}
+    for user in conn.execute(select(User.id, User.created_at, User.updated_at, User.is_verified)):
+        joined[user.id] = user.created_at or now
+        rows.append({"metric": "users", "delta": 1, "occurred_at": joined[user.id]})
+        if user.is_verified:
+            rows.append({"metric": "verified_users", "delta": 1, "occurred_at": user.updated_at or now})
+    for user_id, skill_id in conn.execute(select(user_skills.c.user_id, user_skills.c.skill_id)):
+        rows.append({"metric": f"skill:{skill_id}", "delta": 1, "occurred_at": joined.get(user_id, now)})
+    for user_id, language_id in conn.execute(select(user_languages.c.user_id, user_languages.c.language_id)):
+        rows.append({"metric": f"language:{language_id}", "delta": 1, "occurred_at": joined.get(user_id, now)})
+    for project in conn.execute(select(Project.status, Project.created_at)):
+        rows.append({"metric": f"projects:{project.status}", "delta": 1, "occurred_at": project.created_at or now})
+    if rows:
+        conn.execute(insert(talent_events), rows)
+
+
+# ==================== AGRÉGATION INCRÉMENTALE ====================
+
+class RollupJob:
+    """Replie les nouveaux événements dans `talent_rollups`, puis les supprime.
+
+    Le curseur est avancé par un UPDATE conditionnel au début de la transaction :
+    si un autre worker a déjà traité le lot, rien n'est compté deux fois."""
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+
+    def _upsert(self, conn, rows):
+        dialect_insert = UPSERT_INSERTS.get(conn.dialect.name)
+        if dialect_insert is not None:
+            stmt = dialect_insert(talent_rollups)
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["granularity", "metric", "period_start"],
+                set_={"delta": talent_rollups.c.delta + stmt.excluded.delta}
+            ), rows)
+            return
+        for row in rows:
+            key = (talent_rollups.c.granularity == row["granularity"]) & \
+                  (talent_rollups.c.metric == row["metric"]) & \
+                  (talent_rollups.c.period_start == row["period_start"])
+            if conn.execute(update(talent_rollups).where(key)
+                            .values(delta=talent_rollups.c.delta + row["delta"])).rowcount == 0:
+                conn.execute(insert(talent_rollups).values(**row))
+
+    def run_once(self) -> int:
+        """Traite un lot d'événements ; retourne le nombre d'événements repliés"""
+        with self.bind.connect() as conn:
+            with conn.begin() as transaction:
+                cursor = conn.execute(
+                    select(job_cursors.c.last_id).where(job_cursors.c.name == JOB_NAME)
+                ).scalar()
+                if cursor is None:
+                    conn.execute(insert(job_cursors).values(name=JOB_NAME, last_id=0))
+                    _backfill(conn)
+                    cursor = 0
+
+                events = conn.execute(
+                    select(talent_events).where(talent_events.c.id > cursor)
+                    .order_by(talent_events.c.id).limit(ROLLUP_BATCH_SIZE)
+                ).all()
+                if not events:
+                    return 0
+                moved = conn.execute(
+                    update(job_cursors)
+                    .where(job_cursors.c.name == JOB_NAME, job_cursors.c.last_id == cursor)
+                    .values(last_id=events[-1].id)
+                ).rowcount
+                if moved != 1:
+                    transaction.rollback()
+                    return 0
+
+                deltas = Counter()
+                for event in events:
+                    for granularity in GRANULARITIES:
+                        deltas[(granularity, event.metric, period_start(event.occurred_at, granularity))] += event.delta
+                rows = [
+                    {"granularity": g, "metric": m, "period_start": p, "delta": d}
+                    for (g, m, p), d in deltas.items() if d
+                ]
+                if rows:
+                    self._upsert(conn, rows)
+                # Les agrégats suffisent à la lecture : les événements repliés
+                # sont supprimés dans la même transaction que l'avancée du curseur
+                conn.execute(delete(talent_events).where(talent_events.c.id <= events[-1].id))
+        return len(events)
+
+    async def run(self, interval: float = ROLLUP_INTERVAL_SECONDS):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                while await loop.run_in_executor(None, self.run_once) == ROLLUP_BATCH_SIZE:
+                    pass
+            except Exception:
+                logger.exception("Échec de l'agrégation des événements historiques")
+            await asyncio.sleep(interval)
+
+
+rollup_job = RollupJob()
+
+
+# ==================== LECTURE ====================
+
+def series(db: Session, metric: str, start: date, end: date, granularity: str) -> list:
+    """Série (variation, total cumulé) par période, lue uniquement dans les agrégats"""
+    first = period_start(start, granularity)
+
+    # Total avant la première période : mois complets, puis jours restants
+    month = first.replace(day=1)
+
+    def total_before(rollup_granularity, lower, upper):
+        query = select(func.coalesce(func.sum(talent_rollups.c.delta), 0)).where(
+            talent_rollups.c.granularity == rollup_granularity,
+            talent_rollups.c.metric == metric,
+            talent_rollups.c.period_start < upper,
+        )
+        if lower is not None:
+            query = query.where(talent_rollups.c.period_start >= lower)
+        return db.execute(query).scalar()
+
+    total = total_before("month", None, month) + total_before("day", month, first)
+
+    deltas = dict(db.execute(
+        select(talent_rollups.c.period_start, talent_rollups.c.delta).where(
+            talent_rollups.c.granularity == granularity,
+            talent_rollups.c.metric == metric,
+            talent_rollups.c.period_start.between(first, end),
+        )
+    ).all())
+
+    points = []
+    period = first
+    while period <= end:
+        delta = deltas.get(period, 0)
+        total += delta
+        points.append({"period": period, "delta": delta, "total": total})
+        period = next_period(period, granularity)
+    return points
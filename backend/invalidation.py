@@ -0,0 +1,100 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List
+
+from sqlalchemy import delete, func, insert, select
+
+from database import engine, cache_events
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_POLL_SECONDS = float(os.getenv("INVALIDATION_POLL_SECONDS", 1.0))
+# Les événements plus anciens que cette durée sont purgés
+INVALIDATION_RETENTION_SECONDS = float(os.getenv("INVALIDATION_RETENTION_SECONDS", 3600))
+
+# Identifiant de ce processus : un worker ignore ses propres événements
+ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class InvalidationBus:
+    """Canal d'invalidation entre workers, adossé à la table `cache_events`.
+
+    Chaque worker publie ses modifications dans la table et interroge
+    périodiquement les événements plus récents que son curseur ; les
+    abonnés du canal concerné sont alors appelés avec le contenu publié."""
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+        self._subscribers: Dict[str, List[Callable[[dict], None]]] = {}
+        self._cursor = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def publish(self, *channels: str, payload: dict = None, db=None):
+        """Publie un événement par canal ; avec `db`, dans la transaction de la session"""
+        now = time.time()
+        rows = [
+            {"channel": channel, "origin": ORIGIN,
+             "payload": json.dumps(payload or {}), "created_at": now}
+            for channel in channels
+        ]
+        if db is not None:
+            db.execute(insert(cache_events), rows)
+            return
+        with self.bind.begin() as conn:
+            conn.execute(insert(cache_events), rows)
+
+    def start(self):
+        """Place le curseur sur le dernier événement : l'historique n'est pas rejoué"""
+        with self.bind.connect() as conn:
+            self._cursor = conn.execute(select(func.max(cache_events.c.id))).scalar() or 0
+
+    def poll(self):
+        """Applique les événements publiés par les autres workers depuis le dernier appel"""
+        with self._lock:
+            if self._cursor is None:
+                self.start()
+            with self.bind.connect() as conn:
+                events = conn.execute(
+                    select(cache_events).where(cache_events.c.id > self._cursor)
+                    .order_by(cache_events.c.id)
+                ).all()
+            for event in events:
+                self._cursor = event.id
+                if event.origin == ORIGIN:
+                    continue
+                for callback in self._subscribers.get(event.channel, []):
+                    try:
+                        callback(json.loads(event.payload or "{}"))
+                    except Exception:
+                        logger.exception("Échec du traitement de l'événement %s", event.id)
+
+    def prune(self):
+        with self.bind.begin() as conn:
+            conn.execute(delete(cache_events).where(
+                cache_events.c.created_at < time.time() - INVALIDATION_RETENTION_SECONDS
+            ))
+
+    async def run(self, interval: float = INVALIDATION_POLL_SECONDS):
+        """Boucle d'écoute, lancée au démarrage de chaque worker"""
+        loop = asyncio.get_running_loop()
+        last_prune = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(None, self.poll)
+                if time.monotonic() - last_prune > INVALIDATION_RETENTION_SECONDS / 10:
+                    await loop.run_in_executor(None, self.prune)
+                    last_prune = time.monotonic()
+            except Exception:
+                logger.exception("Échec de la lecture des événements d'invalidation")
+
+
+bus = InvalidationBus()
@@ -1,27 +1,61 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.routing import APIRoute
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import func, or_, and_, select, insert, update, delete, bindparam
 from typing import List
-from datetime import timedelta
-
-from database import get_db, init_db, User, Skill, Language, Project, CollaborationRequest
+from datetime import date, timedelta
+import asyncio
+import logging
+import os
+
+from database import (
+    get_db, init_db, insert_returning, SessionLocal, User, Skill, Language, Project, CollaborationRequest,
+    user_skills, user_languages, projects_archive, collaboration_requests_archive, SKILL_LEVELS,
+    skill_level_counts, apply_skill_level_changes
+)
 from schemas import (
     UserCreate, User as UserSchema, UserUpdate, UserWithProjects,
     SkillCreate, Skill as SkillSchema,
     LanguageCreate, Language as LanguageSchema,
     ProjectCreate, Project as ProjectSchema, ProjectUpdate,
     CollaborationRequestCreate, CollaborationRequest as CollaborationRequestSchema,
-    Token, UserLogin, SearchFilters, TalentMapData
+    Token, UserLogin, SearchFilters, TalentMapData, TalentGraphData,
+    AutocompleteItem, TalentGeoData, SimilarUser, TalentHistory,
+    BatchRequest, BatchResponse, ProfileRequest
 )
 from auth import (
     get_password_hash, authenticate_user, create_access_token,
-    get_current_user, get_current_admin_user, ACCESS_TOKEN_EXPIRE_MINUTES
+    get_current_user, get_current_admin_user, get_optional_user, ACCESS_TOKEN_EXPIRE_MINUTES,
+    warm_up_password_hashing
 )
+from talent_graph import skill_graph
+from autocomplete import autocomplete, item_counts, KINDS as AUTOCOMPLETE_KINDS
+from catalog import catalog_ids
+from similarity import similar_talents
+from invalidation import bus
+import history
+from geo import geohash_for, precision_for_zoom, query_cells, prefix_range
+from rate_limit import RateLimitMiddleware, ConcurrencyLimitMiddleware, RATE_LIMIT_ENABLED, too_many_requests
+from compression import CompressionMiddleware, COMPRESSION_ENABLED, compression_stats
+from batch import BatchDispatcher, BATCH_MAX_REQUESTS
+import archive
+from profiling import ProfilingMiddleware, PROFILING_ENABLED, profiler
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Carte des Talents API", version="1.0.0")
 
+# Limitation de débit et contrôle d'admission (ajoutés avant CORS pour que
+# les réponses 429/503 portent aussi les en-têtes CORS)
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(ConcurrencyLimitMiddleware)
+    app.add_middleware(RateLimitMiddleware)
+
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -31,39 +65,97 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Traces des requêtes pour le profilage à la demande et la capture des requêtes lentes
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Compression négociée (br, zstd, gzip), en dernier pour envelopper toutes les réponses
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
 
 @app.on_event("startup")
-def on_startup():
-    init_db()
+async def on_startup():
+    # En mode multi-workers, le schéma est créé une seule fois par le maître
+    # (voir gunicorn.conf.py) pour éviter les CREATE TABLE concurrents
+    if not os.getenv("SKIP_INIT_DB"):
+        init_db()
+    bus.start()
+    app.state.invalidation_task = asyncio.create_task(bus.run())
+    app.state.rollup_task = asyncio.create_task(history.rollup_job.run())
+    app.state.archive_task = asyncio.create_task(archive.archive_job.run())
+    if os.getenv("WARMUP_ENABLED", "true").lower() == "true":
+        # Préchargement en tâche de fond : le serveur accepte déjà les requêtes
+        app.state.warm_up_future = asyncio.get_running_loop().run_in_executor(None, warm_up)
+        app.state.warm_up_future.add_done_callback(_log_warm_up_failure)
+
+
+def _log_warm_up_failure(future):
+    # Un échec n'est pas bloquant : les caches se chargeront à la première requête
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Échec du préchargement des caches", exc_info=future.exception())
+
+
+BACKGROUND_TASKS = ("invalidation_task", "rollup_task", "archive_task")
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # Arrêt des tâches de fond lancées au démarrage, avant la fermeture de la boucle
+    tasks = [getattr(app.state, name, None) for name in BACKGROUND_TASKS]
+    tasks = [task for task in tasks if task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def warm_up():
+    """Précharge les caches du catalogue et le backend bcrypt"""
+    db = SessionLocal()
+    try:
+        skill_graph.ensure_loaded(db)
+        autocomplete.ensure_loaded(db)
+        catalog_ids.get(db, "skill")
+        catalog_ids.get(db, "language")
+        similar_talents.ensure_loaded(db)
+    finally:
+        db.close()
+    warm_up_password_hashing()
 
 
 # ==================== AUTHENTIFICATION ====================
 
 @app.post("/api/register", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
 def register(user: UserCreate, db: Session = Depends(get_db)):
-    # Vérifier si l'utilisateur existe déjà
-    db_user = db.query(User).filter(
-        or_(User.email == user.email, User.username == user.username)
-    ).first()
-    if db_user:
-        raise HTTPException(
-            status_code=400,
-            detail="Email ou nom d'utilisateur déjà enregistré"
-        )
-    
-    # Créer le nouvel utilisateur
-    hashed_password = get_password_hash(user.password)
-    db_user = User(
+    # Un seul INSERT : l'unicité de l'email et du nom d'utilisateur est
+    # garantie par les contraintes, sans SELECT préalable
+    row = insert_returning(
+        db, User,
         email=user.email,
         username=user.username,
         full_name=user.full_name,
         bio=user.bio,
         avatar_url=user.avatar_url,
-        hashed_password=hashed_password
+        location=user.location,
+        latitude=user.latitude,
+        longitude=user.longitude,
+        geohash=geohash_for(user.latitude, user.longitude),
+        hashed_password=get_password_hash(user.password)
     )
-    db.add(db_user)
+    if row is None:
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Email ou nom d'utilisateur déjà enregistré"
+        )
+    # Objet transitoire construit depuis RETURNING : pas de db.refresh()
+    db_user = User(**row)
+    event = _user_event(db_user, [], [])
+    bus.publish("autocomplete", payload=event, db=db)
+    history.record(db, [("users", 1)])
     db.commit()
-    db.refresh(db_user)
+
+    autocomplete.apply_event(event)
     return db_user
 
 
@@ -108,31 +200,155 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
     return user
 
 
+def _update_association(db, table, column_name, user_id, kind, replace, add, remove):
+    """Applique un remplacement complet et/ou des ajouts/retraits à une table
+    d'association ; retourne (anciens ids, nouveaux ids), ou None si rien n'est demandé"""
+    if replace is None and not add and not remove:
+        return None
+    column = table.c[column_name]
+    valid_ids = catalog_ids.existing(db, kind, set(replace or ()) | set(add or ()))
+    current = set(db.scalars(select(column).where(table.c.user_id == user_id)))
+
+    # Les ids inconnus sont ignorés, comme avec l'ancienne requête IN
+    target = current if replace is None else set(replace) & valid_ids
+    target = (target | (set(add or ()) & valid_ids)) - set(remove or ())
+
+    removed, added = current - target, target - current
+    if removed:
+        db.execute(delete(table).where(table.c.user_id == user_id, column.in_(removed)))
+    if added:
+        db.execute(insert(table), [{"user_id": user_id, column_name: i} for i in added])
+    return current, target
+
+
+@app.get("/api/users/{user_id}/similar", response_model=List[SimilarUser])
+def get_similar_users(user_id: int, k: int = Query(10, ge=1, le=50), db: Session = Depends(get_db)):
+    if db.query(User.id).filter(User.id == user_id).first() is None:
+        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+
+    # Voisins approchés (MinHash/LSH) puis classés par Jaccard exact
+    matches = similar_talents.similar(db, user_id, k=k)
+    users = {
+        user.id: user
+        for user in db.query(User).filter(User.id.in_([match_id for match_id, _ in matches]))
+    }
+    return [
+        {"user": users[match_id], "similarity": round(score, 4)}
+        for match_id, score in matches if match_id in users
+    ]
+
+
+def _user_skill_levels(db, user_id):
+    return db.execute(
+        select(user_skills.c.skill_id, user_skills.c.level).where(user_skills.c.user_id == user_id)
+    ).all()
+
+
+def _user_event(user, skill_ids=None, language_ids=None) -> dict:
+    """État complet d'un utilisateur, publié aux autres workers (graphe, complétion, similarité)"""
+    if skill_ids is None:
+        skill_ids = [skill.id for skill in user.skills]
+    if language_ids is None:
+        language_ids = [language.id for language in user.languages]
+    return {
+        "user_id": user.id,
+        "username": user.username,
+        "full_name": user.full_name,
+        "verified": bool(user.is_verified),
+        "skills": sorted(skill_ids),
+        "languages": sorted(language_ids),
+    }
+
+
 @app.put("/api/users/me", response_model=UserSchema)
 def update_user(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    label_changed = user_update.full_name is not None and user_update.full_name != current_user.full_name
     if user_update.full_name is not None:
         current_user.full_name = user_update.full_name
     if user_update.bio is not None:
         current_user.bio = user_update.bio
     if user_update.avatar_url is not None:
         current_user.avatar_url = user_update.avatar_url
+    if user_update.location is not None:
+        current_user.location = user_update.location
+    if user_update.latitude is not None and user_update.longitude is not None:
+        current_user.latitude = user_update.latitude
+        current_user.longitude = user_update.longitude
     
-    # Mise à jour des compétences
-    if user_update.skills is not None:
-        skills = db.query(Skill).filter(Skill.id.in_(user_update.skills)).all()
-        current_user.skills = skills
-    
-    # Mise à jour des langues
-    if user_update.languages is not None:
-        languages = db.query(Language).filter(Language.id.in_(user_update.languages)).all()
-        current_user.languages = languages
+    # Mise à jour des compétences et des langues : seules les lignes
+    # d'association ajoutées ou retirées sont écrites
+    skill_levels = user_update.skill_levels or []
+    skills_requested = (user_update.skills is not None or user_update.skills_add
+                        or user_update.skills_remove or skill_levels)
+    if skills_requested:
+        old_levels = _user_skill_levels(db, current_user.id)
+    skill_ids = _update_association(
+        db, user_skills, "skill_id", current_user.id, "skill",
+        user_update.skills,
+        (user_update.skills_add or []) + [entry.skill_id for entry in skill_levels],
+        user_update.skills_remove
+    )
+    # Niveaux des compétences présentes après mise à jour, en un UPDATE groupé
+    level_rows = [
+        {"uid": current_user.id, "sid": entry.skill_id, "lvl": entry.level,
+         "years": entry.years_experience}
+        for entry in skill_levels if skill_ids and entry.skill_id in skill_ids[1]
+    ]
+    if level_rows:
+        db.execute(
+            update(user_skills)
+            .where(user_skills.c.user_id == bindparam("uid"), user_skills.c.skill_id == bindparam("sid"))
+            .values(level=bindparam("lvl"),
+                    years_experience=func.coalesce(bindparam("years"), user_skills.c.years_experience)),
+            level_rows
+        )
+    # Compteurs (compétence, niveau) de la carte des talents, dans la même transaction
+    if skills_requested:
+        apply_skill_level_changes(db, old_levels, _user_skill_levels(db, current_user.id))
+    language_ids = _update_association(
+        db, user_languages, "language_id", current_user.id, "language",
+        user_update.languages, user_update.languages_add, user_update.languages_remove
+    )
+    # Événements historiques écrits dans la même transaction que les associations
+    history.record(db, (history.association_changes("skill", *skill_ids) if skill_ids else [])
+                   + (history.association_changes("language", *language_ids) if language_ids else []))
     
+    # Les autres workers ne sont prévenus que pour les caches dont les données
+    # ont changé. L'événement, écrit dans la transaction, porte l'état complet de
+    # l'utilisateur et les effectifs relus des compétences et langues modifiées
+    skills_changed = skill_ids is not None and skill_ids[0] != skill_ids[1]
+    languages_changed = language_ids is not None and language_ids[0] != language_ids[1]
+    channels = []
+    counts = {}
+    if skills_changed:
+        counts["skill"] = item_counts(db, "skill", skill_ids[0] ^ skill_ids[1])
+        channels.append("skill_graph")
+    if languages_changed:
+        counts["language"] = item_counts(db, "language", language_ids[0] ^ language_ids[1])
+    if label_changed or skills_changed or languages_changed:
+        channels.append("autocomplete")
+    if skills_changed or languages_changed:
+        channels.append("similarity")
+    event = None
+    if channels:
+        event = _user_event(current_user, skill_ids and skill_ids[1], language_ids and language_ids[1])
+        event["counts"] = counts
+        bus.publish(*channels, payload=event, db=db)
+
     db.commit()
     db.refresh(current_user)
+
+    # Mise à jour des caches en mémoire de ce worker, avec les valeurs publiées
+    if skills_changed:
+        skill_graph.set_user(event["user_id"], event["skills"], event["verified"])
+    if "autocomplete" in channels:
+        autocomplete.apply_event(event)
+    if skills_changed or languages_changed:
+        similar_talents.set_user(event["user_id"], event["skills"], event["languages"])
     return current_user
 
 
@@ -146,10 +362,19 @@ def verify_user(
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
+    was_verified = user.is_verified
     user.is_verified = True
     user.verified_by_id = admin.id
+    event = None
+    if not was_verified:
+        history.record(db, [("verified_users", 1)])
+        event = _user_event(user)
+        bus.publish("skill_graph", "autocomplete", payload=event, db=db)
     db.commit()
     db.refresh(user)
+    if event is not None:
+        skill_graph.set_user(event["user_id"], event["skills"], True)
+        autocomplete.apply_event(event)
     return user
 
 
@@ -163,14 +388,19 @@ def get_skills(db: Session = Depends(get_db)):
 
 @app.post("/api/skills", response_model=SkillSchema, status_code=status.HTTP_201_CREATED)
 def create_skill(skill: SkillCreate, db: Session = Depends(get_db)):
-    db_skill = db.query(Skill).filter(Skill.name == skill.name).first()
-    if db_skill:
+    row = insert_returning(db, Skill, **skill.dict())
+    if row is None:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Cette compétence existe déjà")
-    
-    db_skill = Skill(**skill.dict())
-    db.add(db_skill)
+    bus.publish("skill_graph", "autocomplete", "catalog", db=db, payload={"skill": {
+        "id": row["id"], "name": row["name"], "category": row["category"],
+    }})
     db.commit()
-    db.refresh(db_skill)
+
+    db_skill = Skill(**row)
+    skill_graph.add_skill(db_skill.id, db_skill.name, db_skill.category)
+    autocomplete.add_skill(db_skill.id, db_skill.name)
+    catalog_ids.add("skill", db_skill.id)
     return db_skill
 
 
@@ -184,14 +414,18 @@ def get_languages(db: Session = Depends(get_db)):
 
 @app.post("/api/languages", response_model=LanguageSchema, status_code=status.HTTP_201_CREATED)
 def create_language(language: LanguageCreate, db: Session = Depends(get_db)):
-    db_language = db.query(Language).filter(Language.name == language.name).first()
-    if db_language:
+    row = insert_returning(db, Language, **language.dict())
+    if row is None:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Cette langue existe déjà")
-    
-    db_language = Language(**language.dict())
-    db.add(db_language)
+    bus.publish("autocomplete", "catalog", db=db, payload={"language": {
+        "id": row["id"], "name": row["name"], "code": row["code"],
+    }})
     db.commit()
-    db.refresh(db_language)
+
+    db_language = Language(**row)
+    autocomplete.add_language(db_language.id, db_language.name, db_language.code)
+    catalog_ids.add("language", db_language.id)
     return db_language
 
 
@@ -202,8 +436,12 @@ def get_projects(
     skip: int = 0,
     limit: int = 100,
     status_filter: str = None,
+    include_archived: bool = False,
     db: Session = Depends(get_db)
 ):
+    # Par défaut, seuls les projets chauds sont lus (les terminés sont archivés)
+    if include_archived:
+        return archive.projects_with_archive(db, status_filter, skip, limit)
     query = db.query(Project)
     if status_filter:
         query = query.filter(Project.status == status_filter)
@@ -212,8 +450,10 @@ def get_projects(
 
 
 @app.get("/api/projects/{project_id}", response_model=ProjectSchema)
-def get_project(project_id: int, db: Session = Depends(get_db)):
+def get_project(project_id: int, include_archived: bool = False, db: Session = Depends(get_db)):
     project = db.query(Project).filter(Project.id == project_id).first()
+    if not project and include_archived:
+        project = archive.archived_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projet non trouvé")
     return project
@@ -225,11 +465,17 @@ def create_project(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    db_project = Project(**project.dict(), owner_id=current_user.id)
-    db.add(db_project)
+    row = insert_returning(
+        db, Project, **project.dict(), owner_id=current_user.id,
+        geohash=geohash_for(project.latitude, project.longitude)
+    )
+    db_project = Project(**row)
+    set_committed_value(db_project, "owner", current_user)
+    # Sérialisé avant le commit, qui expirerait current_user (et relancerait un SELECT)
+    response = ProjectSchema.model_validate(db_project)
+    history.record(db, [(f"projects:{db_project.status}", 1)])
     db.commit()
-    db.refresh(db_project)
-    return db_project
+    return response
 
 
 @app.put("/api/projects/{project_id}", response_model=ProjectSchema)
@@ -246,8 +492,11 @@ def update_project(
     if project.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Non autorisé")
     
+    previous_status = project.status
     for key, value in project_update.dict(exclude_unset=True).items():
         setattr(project, key, value)
+    if project.status != previous_status:
+        history.record(db, [(f"projects:{previous_status}", -1), (f"projects:{project.status}", 1)])
     
     db.commit()
     db.refresh(project)
@@ -267,11 +516,30 @@ def delete_project(
     if project.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Non autorisé")
     
+    history.record(db, [(f"projects:{project.status}", -1)])
     db.delete(project)
     db.commit()
     return None
 
 
+@app.post("/api/projects/{project_id}/restore", response_model=ProjectSchema)
+def restore_project(
+    project_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    project = archive.archived_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Projet archivé non trouvé")
+    
+    if project.owner_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Non autorisé")
+    
+    archive.restore_project(db, project_id)
+    db.commit()
+    return db.query(Project).filter(Project.id == project_id).first()
+
+
 # ==================== DEMANDES DE COLLABORATION ====================
 
 @app.post("/api/collaboration-requests", response_model=CollaborationRequestSchema, status_code=status.HTTP_201_CREATED)
@@ -299,10 +567,13 @@ def create_collaboration_request(
 @app.get("/api/projects/{project_id}/collaboration-requests", response_model=List[CollaborationRequestSchema])
 def get_project_collaboration_requests(
     project_id: int,
+    include_archived: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     project = db.query(Project).filter(Project.id == project_id).first()
+    if not project and include_archived:
+        project = archive.archived_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projet non trouvé")
     
@@ -312,6 +583,11 @@ def get_project_collaboration_requests(
     requests = db.query(CollaborationRequest).filter(
         CollaborationRequest.project_id == project_id
     ).all()
+    if include_archived:
+        requests += archive.archived_collaboration_requests(
+            db, collaboration_requests_archive.c.project_id == project_id
+        )
+        requests.sort(key=lambda r: r.id)
     return requests
 
 
@@ -342,6 +618,28 @@ def accept_collaboration_request(
     return {"message": "Demande acceptée"}
 
 
+@app.post("/api/collaboration-requests/{request_id}/restore", response_model=CollaborationRequestSchema)
+def restore_collaboration_request(
+    request_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    archived = archive.archived_collaboration_requests(db, collaboration_requests_archive.c.id == request_id)
+    if not archived:
+        raise HTTPException(status_code=404, detail="Demande archivée non trouvée")
+    
+    project = db.query(Project).filter(Project.id == archived[0].project_id).first()
+    if not project:
+        # Les demandes d'un projet archivé reviennent avec lui
+        raise HTTPException(status_code=409, detail="Le projet de cette demande est archivé")
+    if project.owner_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Non autorisé")
+    
+    archive.restore_collaboration_request(db, request_id)
+    db.commit()
+    return db.query(CollaborationRequest).filter(CollaborationRequest.id == request_id).first()
+
+
 # ==================== RECHERCHE ====================
 
 @app.post("/api/search", response_model=List[UserSchema])
@@ -367,6 +665,19 @@ def search_users(
     if filters.skills:
         query = query.join(User.skills).filter(Skill.name.in_(filters.skills))
     
+    if filters.min_levels:
+        # Un parcours de plage (skill_id, level >= n) sur l'index composite par compétence
+        skill_ids = dict(db.query(Skill.name, Skill.id).filter(Skill.name.in_(filters.min_levels)).all())
+        if len(skill_ids) < len(filters.min_levels):
+            return []
+        for name, min_level in filters.min_levels.items():
+            query = query.filter(User.id.in_(
+                select(user_skills.c.user_id).where(
+                    user_skills.c.skill_id == skill_ids[name],
+                    user_skills.c.level >= min_level
+                )
+            ))
+    
     if filters.languages:
         query = query.join(User.languages).filter(Language.name.in_(filters.languages))
     
@@ -374,6 +685,19 @@ def search_users(
     return users
 
 
+@app.get("/api/autocomplete", response_model=List[AutocompleteItem])
+def autocomplete_search(
+    q: str,
+    kind: str = "skill",
+    limit: int = 10,
+    db: Session = Depends(get_db)
+):
+    if kind not in AUTOCOMPLETE_KINDS:
+        raise HTTPException(status_code=400, detail="Type de complétion inconnu")
+    # Index en mémoire : aucune requête SQL une fois l'index chargé
+    return autocomplete.search(db, kind, q, limit=min(limit, 50))
+
+
 # ==================== CARTE DES TALENTS ====================
 
 @app.get("/api/talent-map", response_model=TalentMapData)
@@ -381,19 +705,27 @@ def get_talent_map_data(db: Session = Depends(get_db)):
     total_users = db.query(func.count(User.id)).scalar()
     total_skills = db.query(func.count(Skill.id)).scalar()
     total_languages = db.query(func.count(Language.id)).scalar()
-    total_projects = db.query(func.count(Project.id)).scalar()
+    # Les projets archivés restent comptés dans les statistiques
+    total_projects = db.query(func.count(Project.id)).scalar() + \
+        db.query(func.count(projects_archive.c.id)).scalar()
     verified_users_count = db.query(func.count(User.id)).filter(User.is_verified == True).scalar()
     
-    # Distribution des compétences
-    skills_dist = db.query(
-        Skill.name,
-        Skill.category,
-        func.count(User.id).label('count')
-    ).join(Skill.users).group_by(Skill.id).all()
+    # Distribution des compétences et histogramme des niveaux, lus dans les
+    # compteurs tenus à jour par les écritures (une ligne par compétence et niveau)
+    histograms = {}
+    for skill_id, level, count in db.query(
+        skill_level_counts.c.skill_id, skill_level_counts.c.level, skill_level_counts.c.count
+    ).filter(skill_level_counts.c.count > 0):
+        histograms.setdefault(skill_id, dict.fromkeys(SKILL_LEVELS, 0))[level] = count
     
     skills_distribution = [
-        {"name": skill.name, "category": skill.category, "count": skill.count}
-        for skill in skills_dist
+        {
+            "name": skill.name,
+            "category": skill.category,
+            "count": sum(histograms[skill.id].values()),
+            "levels": histograms[skill.id]
+        }
+        for skill in db.query(Skill.id, Skill.name, Skill.category).filter(Skill.id.in_(histograms))
     ]
     
     # Distribution des langues
@@ -418,6 +750,223 @@ def get_talent_map_data(db: Session = Depends(get_db)):
     }
 
 
+@app.get("/api/talent-map/graph", response_model=TalentGraphData)
+def get_talent_map_graph(
+    category: str = None,
+    verified_only: bool = False,
+    min_count: int = 1,
+    min_jaccard: float = 0.1,
+    db: Session = Depends(get_db)
+):
+    # Matrice de co-occurrence en cache, mise à jour à chaque modification de profil
+    return skill_graph.graph(
+        db, category=category, verified_only=verified_only,
+        min_count=min_count, min_jaccard=min_jaccard
+    )
+
+
+@app.get("/api/talent-map/geo", response_model=TalentGeoData)
+def get_talent_map_geo(
+    bbox: str,
+    zoom: int = 5,
+    top_skills: int = 5,
+    db: Session = Depends(get_db)
+):
+    # bbox = min_lon,min_lat,max_lon,max_lat (ordre GeoJSON)
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox invalide")
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise HTTPException(status_code=400, detail="bbox invalide")
+
+    # Chaque tuile est une plage [préfixe, préfixe + '{') sur l'index geohash
+    precision = precision_for_zoom(zoom)
+    ranges = [prefix_range(cell) for cell in query_cells(min_lat, min_lon, max_lat, max_lon, precision)]
+
+    def in_bbox(model):
+        return and_(
+            or_(*[and_(model.geohash >= lo, model.geohash < hi) for lo, hi in ranges]),
+            model.latitude.between(min_lat, max_lat),
+            model.longitude.between(min_lon, max_lon),
+        )
+
+    user_cell = func.substr(User.geohash, 1, precision)
+    project_cell = func.substr(Project.geohash, 1, precision)
+
+    clusters = {}
+
+    def cluster(cell):
+        return clusters.setdefault(cell, {
+            "geohash": cell, "lat_sum": 0.0, "lon_sum": 0.0, "points": 0,
+            "user_count": 0, "project_count": 0, "top_skills": []
+        })
+
+    for cell, count, lat_sum, lon_sum in db.query(
+        user_cell, func.count(User.id), func.sum(User.latitude), func.sum(User.longitude)
+    ).filter(in_bbox(User)).group_by(user_cell):
+        c = cluster(cell)
+        c["user_count"] = count
+        c["lat_sum"] += lat_sum
+        c["lon_sum"] += lon_sum
+        c["points"] += count
+
+    for cell, count, lat_sum, lon_sum in db.query(
+        project_cell, func.count(Project.id), func.sum(Project.latitude), func.sum(Project.longitude)
+    ).filter(in_bbox(Project)).group_by(project_cell):
+        c = cluster(cell)
+        c["project_count"] = count
+        c["lat_sum"] += lat_sum
+        c["lon_sum"] += lon_sum
+        c["points"] += count
+
+    skill_counts = db.query(user_cell, Skill.name, func.count(User.id).label("count")).join(
+        user_skills, user_skills.c.user_id == User.id
+    ).join(Skill, Skill.id == user_skills.c.skill_id).filter(in_bbox(User)).group_by(
+        user_cell, Skill.id
+    ).all()
+    for cell, name, count in sorted(skill_counts, key=lambda row: -row.count):
+        if len(clusters[cell]["top_skills"]) < top_skills:
+            clusters[cell]["top_skills"].append({"name": name, "count": count})
+
+    return {
+        "zoom": zoom,
+        "precision": precision,
+        "clusters": [
+            {
+                "geohash": c["geohash"],
+                "latitude": c["lat_sum"] / c["points"],
+                "longitude": c["lon_sum"] / c["points"],
+                "user_count": c["user_count"],
+                "project_count": c["project_count"],
+                "top_skills": c["top_skills"],
+            }
+            for c in clusters.values()
+        ]
+    }
+
+
+@app.get("/api/talent-map/history", response_model=TalentHistory)
+def get_talent_map_history(
+    metric: str,
+    from_date: date = Query(None, alias="from"),
+    to_date: date = Query(None, alias="to"),
+    granularity: str = "month",
+    db: Session = Depends(get_db)
+):
+    # metric : users, verified_users, projects:<statut>, skill:<id> ou language:<id>
+    if granularity not in history.GRANULARITIES:
+        raise HTTPException(status_code=400, detail="Granularité invalide (day, week ou month)")
+    kind, _, value = metric.partition(":")
+    if not (metric in ("users", "verified_users")
+            or (kind == "projects" and value)
+            or (kind in ("skill", "language") and value.isdigit())):
+        raise HTTPException(status_code=400, detail="Métrique inconnue")
+
+    to_date = to_date or date.today()
+    from_date = from_date or to_date - timedelta(days=365)
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="Période invalide")
+    if (to_date - from_date).days > history.MAX_POINTS * {"day": 1, "week": 7, "month": 31}[granularity]:
+        raise HTTPException(status_code=400, detail="Période trop longue pour cette granularité")
+
+    # Lecture des seuls agrégats (talent_rollups), jamais des tables de base
+    return {
+        "metric": metric,
+        "granularity": granularity,
+        "points": history.series(db, metric, from_date, to_date, granularity),
+    }
+
+
+# ==================== REQUÊTES GROUPÉES ====================
+
+batch_dispatcher = BatchDispatcher(app)
+
+
+@app.post("/api/batch", response_model=BatchResponse)
+async def run_batch(
+    batch: BatchRequest,
+    request: Request,
+    current_user: User = Depends(get_optional_user),
+    db: Session = Depends(get_db)
+):
+    # Un seul aller-retour pour plusieurs appels : utilisateur authentifié une
+    # fois, session partagée, lectures consécutives exécutées en parallèle
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"Au plus {BATCH_MAX_REQUESTS} requêtes par lot")
+    # Chaque sous-requête coûte un jeton du budget par défaut, comme un appel
+    # séparé (le lot lui-même a déjà payé le premier)
+    charge = getattr(request.state, "rate_limit", None)
+    if charge is not None and len(batch.requests) > 1:
+        allowed, retry_after = await charge.consume(len(batch.requests) - 1)
+        if not allowed:
+            return too_many_requests(retry_after)
+    return {"responses": await batch_dispatcher.run(request, batch.requests, db, current_user)}
+
+
+# ==================== ADMINISTRATION ====================
+
+@app.get("/api/admin/compression-stats")
+def get_compression_stats(admin: User = Depends(get_current_admin_user)):
+    # Par route : réponses, octets avant/après, taux et temps CPU de compression
+    return compression_stats.snapshot()
+
+
+@app.post("/api/admin/profiles", status_code=status.HTTP_201_CREATED)
+def start_profile(profile_request: ProfileRequest, admin: User = Depends(get_current_admin_user)):
+    # Sans route : fenêtre de `seconds` secondes sur tous les threads ;
+    # avec route : cumul des `requests` prochaines requêtes sur cette route
+    if profile_request.route is None:
+        return profiler.start_window(profile_request.seconds).summary()
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=400, detail="Profilage des requêtes désactivé (PROFILING_ENABLED)")
+    method = profile_request.method.upper()
+    if not any(
+        isinstance(route, APIRoute) and route.path == profile_request.route and method in route.methods
+        for route in app.routes
+    ):
+        raise HTTPException(status_code=404, detail="Route inconnue")
+    return profiler.start_route(method, profile_request.route, profile_request.requests,
+                                profile_request.seconds).summary()
+
+
+@app.get("/api/admin/profiles")
+def list_profiles(admin: User = Depends(get_current_admin_user)):
+    # Sessions lancées par un admin et requêtes lentes (tampon circulaire)
+    return [profile.summary() for profile in profiler.profiles()]
+
+
+@app.get("/api/admin/profiles/{profile_id}")
+def download_profile(profile_id: str, admin: User = Depends(get_current_admin_user)):
+    profile = profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profil non trouvé")
+    return JSONResponse(
+        jsonable_encoder(profile.to_dict()),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.json"'}
+    )
+
+
+@app.get("/api/admin/profiles/{profile_id}/flamegraph")
+def download_flamegraph(profile_id: str, admin: User = Depends(get_current_admin_user)):
+    # Piles repliées : flamegraph.pl, speedscope ou inferno
+    profile = profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profil non trouvé")
+    return PlainTextResponse(
+        profile.flamegraph(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
+
+
+@app.post("/api/admin/archive/run")
+def run_archive(admin: User = Depends(get_current_admin_user)):
+    # Passage d'archivage immédiat (normalement toutes les ARCHIVE_INTERVAL_SECONDS)
+    return archive.archive_job.run_once()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
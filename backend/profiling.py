@@ -0,0 +1,415 @@
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from database import engine
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 10))
+# Les requêtes plus lentes sont gardées avec leur profil complet (0 : désactivé)
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", 1000))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", 50))
+# Une requête en cours depuis cette fraction du seuil est échantillonnée : une
+# requête lente a ainsi ses piles, sans échantillonner toutes les requêtes
+SLOW_SAMPLE_AFTER = 0.5
+# Fréquence de la surveillance des requêtes en cours (secondes)
+SLOW_WATCH_INTERVAL = max(PROFILE_SLOW_REQUEST_MS * SLOW_SAMPLE_AFTER / 4000, 0.05)
+MAX_SESSION_SECONDS = 300
+MAX_SQL_STATEMENTS = 500
+
+# Trace de la requête en cours ; copiée dans les threads du pool avec le contexte
+_current_trace = contextvars.ContextVar("profiling_trace", default=None)
+
+# Feuilles de pile d'un thread inactif (boucle en attente, workers des pools libres)
+_IDLE_FILES = ("selectors.py", "threading.py", "queue.py", os.path.join("futures", "thread.py"))
+# Profondeur (depuis la base de la pile) où chercher le contexte d'un worker du pool
+_CONTEXT_DEPTH = 6
+
+
+# ==================== ÉCHANTILLONNAGE ====================
+
+_labels = {}
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def collapse(stack) -> str:
+    """Pile au format « replié » (racine;...;feuille), lu par flamegraph.pl et speedscope"""
+    return ";".join(_label(code) for code in stack)
+
+
+def _thread_context(frames) -> Optional[contextvars.Context]:
+    """Contexte copié par le pool de threads (run_in_threadpool) pour la tâche en
+    cours : variable locale d'un des premiers frames du worker"""
+    for frame in frames[:_CONTEXT_DEPTH]:
+        for value in frame.f_locals.values():
+            if isinstance(value, contextvars.Context):
+                return value
+    return None
+
+
+class Sampler:
+    """Thread d'échantillonnage : lit les piles de tous les threads actifs à
+    intervalle régulier tant qu'au moins un profil est à l'écoute.
+
+    `watch`, appelé toutes les `watch_interval` secondes (même au repos), peut
+    inscrire de nouveaux consommateurs (requêtes devenues lentes)."""
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS, watch=None,
+                 watch_interval: float = SLOW_WATCH_INTERVAL):
+        self.interval = interval_ms / 1000
+        self.watch = watch
+        self.watch_interval = watch_interval
+        self._consumers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+
+    def add(self, consumer):
+        self.start()
+        with self._lock:
+            self._consumers.add(consumer)
+        self._wake.set()
+
+    def discard(self, consumer):
+        with self._lock:
+            self._consumers.discard(consumer)
+
+    def _run(self):
+        own = threading.get_ident()
+        watched_at = 0.0
+        while True:
+            if self.watch is not None and time.perf_counter() - watched_at >= self.watch_interval:
+                watched_at = time.perf_counter()
+                self.watch()
+            with self._lock:
+                for consumer in [c for c in self._consumers if c.expired()]:
+                    consumer.finish()
+                    self._consumers.discard(consumer)
+                consumers = list(self._consumers)
+                if not consumers:
+                    self._wake.clear()
+            if not consumers:
+                self._wake.wait(self.watch_interval if self.watch is not None else None)
+                continue
+
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                chain = []
+                while frame is not None:
+                    chain.append(frame)
+                    frame = frame.f_back
+                chain.reverse()
+                stack = [frame.f_code for frame in chain]
+                context = _thread_context(chain) if any(c.by_thread for c in consumers) else None
+                for consumer in consumers:
+                    consumer.add_sample(ident, stack, context)
+            # Ne pas garder les frames (et leurs variables locales) jusqu'au tick suivant
+            frames = chain = frame = context = None
+            time.sleep(self.interval)
+
+
+# ==================== PROFILS ====================
+
+class Profile:
+    """Échantillons de pile et requêtes SQL (avec durées) d'une période"""
+
+    kind = "window"
+    # Échantillons filtrés par thread (contexte du worker requis)
+    by_thread = False
+
+    def __init__(self, **meta):
+        self.id = uuid.uuid4().hex[:12]
+        self.meta = meta
+        self.started_at = datetime.utcnow()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.samples = Counter()
+        self.sql = []
+        self.done = False
+        self._lock = threading.Lock()
+
+    def accepts(self, ident, stack, context) -> bool:
+        return True
+
+    def add_sample(self, ident, stack, context=None):
+        if self.accepts(ident, stack, context):
+            key = collapse(stack)
+            with self._lock:
+                self.samples[key] += 1
+
+    def add_sql(self, statement: str, duration_ms: float, executemany: bool):
+        with self._lock:
+            if len(self.sql) < MAX_SQL_STATEMENTS:
+                self.sql.append({
+                    "statement": statement[:2000],
+                    "duration_ms": round(duration_ms, 3),
+                    "executemany": executemany,
+                    "at_ms": round((time.perf_counter() - self._start) * 1000, 3),
+                })
+
+    def merge(self, other: "Profile"):
+        with self._lock:
+            self.samples.update(other.samples)
+            self.sql.extend(other.sql[:MAX_SQL_STATEMENTS - len(self.sql)])
+
+    def expired(self) -> bool:
+        return False
+
+    def finish(self):
+        if not self.done:
+            self.done = True
+            self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+
+    def flamegraph(self) -> str:
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "done": self.done,
+                "started_at": self.started_at,
+                "duration_ms": self.duration_ms,
+                "sample_count": sum(self.samples.values()),
+                "sample_interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+                "sql_count": len(self.sql),
+                "sql_total_ms": round(sum(s["duration_ms"] for s in self.sql), 3),
+                **self.meta,
+            }
+
+    def to_dict(self) -> dict:
+        data = self.summary()
+        with self._lock:
+            data["stacks"] = [{"stack": stack, "count": count} for stack, count in self.samples.most_common()]
+            data["sql"] = list(self.sql)
+        return data
+
+
+class WindowProfile(Profile):
+    """Tous les threads pendant `seconds` secondes"""
+
+    def __init__(self, seconds: float):
+        super().__init__(seconds=seconds)
+        self.deadline = time.perf_counter() + seconds
+
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.deadline
+
+
+class RequestTrace(Profile):
+    """Une requête : durée et requêtes SQL (rattachées par contexte), plus les
+    échantillons de pile quand le profileur l'inscrit auprès de l'échantillonneur.
+
+    Seuls les échantillons de la requête elle-même sont retenus : sur le thread
+    de la boucle, quand sa tâche est la tâche en cours ; sur un worker du pool,
+    quand le contexte copié pour l'appel porte cette trace."""
+
+    kind = "request"
+    by_thread = True
+
+    def __init__(self, scope):
+        super().__init__(method=scope["method"], path=scope["path"], route=None, status=None)
+        self.scope = scope
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.thread = threading.get_ident()
+        self.sampled = False
+
+    def accepts(self, ident, stack, context) -> bool:
+        if ident == self.thread:
+            return asyncio.current_task(self.loop) is self.task
+        return context is not None and context.get(_current_trace) is self
+
+
+class RouteProfile(Profile):
+    """Cumul des `requests` prochaines requêtes sur une route (méthode, gabarit de chemin)"""
+
+    kind = "route"
+
+    def __init__(self, method: str, route: str, requests: int, seconds: float):
+        super().__init__(method=method, route=route, requests=requests, completed=0)
+        self.deadline = time.perf_counter() + seconds
+
+    def matches(self, trace: RequestTrace) -> bool:
+        return trace.meta["method"] == self.meta["method"] and trace.meta["route"] == self.meta["route"]
+
+    def expired(self) -> bool:
+        return self.done or time.perf_counter() >= self.deadline
+
+
+# ==================== PROFILEUR ====================
+
+class Profiler:
+    def __init__(self):
+        self.sampler = Sampler(watch=self._sample_slow if PROFILE_SLOW_REQUEST_MS > 0 else None)
+        self._inflight = set()
+        self.sessions = deque(maxlen=20)
+        self.slow = deque(maxlen=PROFILE_BUFFER_SIZE)
+        self._windows: List[WindowProfile] = []
+        self._routes: List[RouteProfile] = []
+        self._lock = threading.Lock()
+
+    def _active(self, profiles):
+        for profile in [p for p in profiles if p.expired()]:
+            profile.finish()
+            profiles.remove(profile)
+        return profiles
+
+    def start_window(self, seconds: float) -> Profile:
+        profile = WindowProfile(min(seconds, MAX_SESSION_SECONDS))
+        with self._lock:
+            self._windows.append(profile)
+            self.sessions.append(profile)
+        self.sampler.add(profile)
+        return profile
+
+    def start_route(self, method: str, route: str, requests: int, seconds: float) -> Profile:
+        profile = RouteProfile(method.upper(), route, requests, min(seconds, MAX_SESSION_SECONDS))
+        with self._lock:
+            self._routes.append(profile)
+            self.sessions.append(profile)
+        return profile
+
+    def tracing(self) -> bool:
+        return PROFILE_SLOW_REQUEST_MS > 0 or bool(self._routes)
+
+    def begin_request(self, scope) -> RequestTrace:
+        """Trace légère (durée et SQL). Les piles sont échantillonnées dès le
+        début pendant une session de profilage ; sinon seulement si la requête
+        dure (voir `_sample_slow`)"""
+        trace = RequestTrace(scope)
+        with self._lock:
+            self._inflight.add(trace)
+            trace.sampled = bool(self._routes or self._windows)
+        if trace.sampled:
+            self.sampler.add(trace)
+        elif PROFILE_SLOW_REQUEST_MS > 0:
+            self.sampler.start()
+        return trace
+
+    def _sample_slow(self):
+        """Appelé par l'échantillonneur : inscrit les requêtes en cours depuis
+        plus de SLOW_SAMPLE_AFTER × PROFILE_SLOW_REQUEST_MS"""
+        threshold = PROFILE_SLOW_REQUEST_MS * SLOW_SAMPLE_AFTER / 1000
+        now = time.perf_counter()
+        with self._lock:
+            late = [t for t in self._inflight if not t.sampled and now - t._start >= threshold]
+            # Sous le verrou : end_request ne peut pas terminer la trace entre-temps
+            for trace in late:
+                trace.sampled = True
+                trace.meta["sampled_from_ms"] = round((now - trace._start) * 1000, 3)
+                self.sampler.add(trace)
+
+    def end_request(self, trace: RequestTrace, status: int):
+        with self._lock:
+            self._inflight.discard(trace)
+            sampled = trace.sampled
+        if sampled:
+            self.sampler.discard(trace)
+        trace.finish()
+        route = trace.scope.get("route")
+        trace.meta["route"] = getattr(route, "path", None)
+        trace.meta["status"] = status
+        trace.scope = {}
+        trace.loop = trace.task = None
+        with self._lock:
+            for profile in self._active(self._routes):
+                if profile.matches(trace):
+                    profile.merge(trace)
+                    profile.meta["completed"] += 1
+                    if profile.meta["completed"] >= profile.meta["requests"]:
+                        profile.finish()
+            self._active(self._routes)
+            if PROFILE_SLOW_REQUEST_MS > 0 and trace.duration_ms >= PROFILE_SLOW_REQUEST_MS:
+                self.slow.append(trace)
+
+    def record_sql(self, statement: str, duration_ms: float, executemany: bool):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_sql(statement, duration_ms, executemany)
+        for window in list(self._windows):
+            if not window.expired():
+                window.add_sql(statement, duration_ms, executemany)
+
+    def profiles(self) -> List[Profile]:
+        with self._lock:
+            self._active(self._windows)
+            self._active(self._routes)
+            return list(self.sessions) + list(self.slow)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return next((p for p in self.profiles() if p.id == profile_id), None)
+
+
+profiler = Profiler()
+
+
+# ==================== SQL ====================
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_trace.get() is not None or profiler._windows:
+        context._profiling_start = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_profiling_start", None)
+    if start is not None:
+        # Les paramètres ne sont pas conservés (mots de passe hachés, emails)
+        profiler.record_sql(statement, (time.perf_counter() - start) * 1000, executemany)
+
+
+# ==================== MIDDLEWARE ====================
+
+class ProfilingMiddleware:
+    """Trace les requêtes (durée et SQL, plus les piles pendant une session de
+    profilage) quand un profil de route est actif ou que la capture des
+    requêtes lentes est activée"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.tracing():
+            return await self.app(scope, receive, send)
+
+        trace = profiler.begin_request(scope)
+        token = _current_trace.set(trace)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_trace.reset(token)
+            profiler.end_request(trace, status[0])
@@ -0,0 +1,306 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+from sqlalchemy import case, literal, select, insert, update
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from database import engine, rate_limit_buckets, UPSERT_INSERTS
+from auth import SECRET_KEY, ALGORITHM
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory, database
+# Nombre de workers servant l'API : le budget par défaut leur est réparti
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 15))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", 30))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("QUEUE_TIMEOUT_SECONDS", 2.0))
+
+
+class Budget:
+    """Budget d'un seau à jetons : `rate` jetons par seconde, au plus `burst` jetons"""
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+
+    def per_worker(self, workers: int) -> "Budget":
+        """Part d'un worker lorsque chacun garde ses propres seaux"""
+        return Budget(per_minute=self.rate * 60 / workers, burst=max(1, math.ceil(self.burst / workers)))
+
+
+# Budgets par route (méthode, chemin), tenus par le backend configuré (partagé
+# entre workers avec `database`) ; les autres routes /api utilisent DEFAULT_BUDGET
+ROUTE_BUDGETS = {
+    ("POST", "/api/token"): Budget(per_minute=10, burst=5),
+    ("POST", "/api/register"): Budget(per_minute=5, burst=3),
+    ("POST", "/api/search"): Budget(per_minute=60, burst=20),
+}
+# Budget par défaut, consommé par chaque requête /api : ses seaux restent en
+# mémoire du worker (pas d'écriture en base par requête), chaque worker recevant
+# sa part du budget
+DEFAULT_BUDGET = Budget(
+    per_minute=float(os.getenv("RATE_LIMIT_DEFAULT_PER_MINUTE", 300)),
+    burst=int(os.getenv("RATE_LIMIT_DEFAULT_BURST", 100)),
+).per_worker(WEB_CONCURRENCY)
+
+
+# ==================== BACKENDS ====================
+
+class RateLimitBackend(ABC):
+    """Stockage des seaux à jetons. `consume` retourne (autorisé, délai avant nouvel essai)"""
+
+    # Un backend bloquant (E/S) est appelé depuis le pool de threads
+    blocking = False
+
+    @abstractmethod
+    def consume(self, key: str, budget: Budget, cost: float = 1.0) -> Tuple[bool, float]:
+        """Retire `cost` jetons du seau `key` s'il en contient assez"""
+
+
+def _refill(tokens: float, updated_at: float, now: float, budget: Budget) -> float:
+    return min(budget.burst, tokens + (now - updated_at) * budget.rate)
+
+
+def _retry_after(tokens: float, budget: Budget, cost: float) -> float:
+    return (cost - tokens) / budget.rate if budget.rate > 0 else 60.0
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Seaux gardés dans le processus ; suffisant avec un seul worker"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, budget, cost=1.0):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (budget.burst, now))
+            tokens = _refill(tokens, updated_at, now, budget)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                return False, _retry_after(tokens, budget, cost)
+            self._buckets[key] = (tokens - cost, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return True, 0.0
+
+    def _prune(self, now: float):
+        # Un seau inactif depuis une minute est de nouveau plein : on peut l'oublier
+        stale = [k for k, (_, updated_at) in self._buckets.items() if now - updated_at > 60]
+        for k in stale:
+            del self._buckets[k]
+
+
+class DatabaseBackend(RateLimitBackend):
+    """Seaux stockés dans la table `rate_limit_buckets`, partagés entre workers"""
+
+    blocking = True
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+
+    def consume(self, key, budget, cost=1.0):
+        now = time.time()
+        with self.bind.begin() as conn:
+            dialect_insert = UPSERT_INSERTS.get(conn.dialect.name)
+            if dialect_insert is not None:
+                allowed, tokens = self._consume_upsert(conn, dialect_insert, key, budget, cost, now)
+            else:
+                allowed, tokens = self._consume_select(conn, key, budget, cost, now)
+        if not allowed:
+            return False, _retry_after(tokens, budget, cost)
+        return True, 0.0
+
+    def _consume_upsert(self, conn, dialect_insert, key, budget, cost, now):
+        """Recharge et retrait en une seule instruction atomique :
+        INSERT ... ON CONFLICT(key) DO UPDATE ... WHERE assez de jetons RETURNING.
+        Aucune ligne retournée : le seau existe et ne contient pas assez de jetons.
+        Le seau refusé n'est pas modifié (la recharge se recalcule depuis updated_at)."""
+        column = rate_limit_buckets.c
+        refilled = column.tokens + (literal(now) - column.updated_at) * budget.rate
+        refilled = case((refilled > budget.burst, literal(float(budget.burst))), else_=refilled)
+        stmt = dialect_insert(rate_limit_buckets).values(key=key, tokens=budget.burst - cost, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[column.key],
+            set_={"tokens": refilled - cost, "updated_at": now},
+            where=refilled >= cost,
+        ).returning(column.tokens)
+        if conn.execute(stmt).first() is not None:
+            return True, None
+        row = conn.execute(
+            select(column.tokens, column.updated_at).where(column.key == key)
+        ).first()
+        return False, _refill(row.tokens, row.updated_at, now, budget) if row else 0.0
+
+    def _consume_select(self, conn, key, budget, cost, now):
+        row = conn.execute(
+            select(rate_limit_buckets.c.tokens, rate_limit_buckets.c.updated_at)
+            .where(rate_limit_buckets.c.key == key)
+        ).first()
+        if row is None:
+            tokens = float(budget.burst)
+            stmt = insert(rate_limit_buckets)
+        else:
+            tokens = _refill(row.tokens, row.updated_at, now, budget)
+            stmt = update(rate_limit_buckets).where(rate_limit_buckets.c.key == key)
+
+        allowed = tokens >= cost
+        remaining = tokens - cost if allowed else tokens
+        conn.execute(stmt.values(key=key, tokens=remaining, updated_at=now))
+        return allowed, tokens
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    if RATE_LIMIT_BACKEND == "database":
+        return DatabaseBackend()
+    return InMemoryBackend()
+
+
+# ==================== MIDDLEWARES ====================
+
+def _user_from_headers(scope) -> Optional[str]:
+    """Nom d'utilisateur du jeton Bearer, sans accès à la base"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except JWTError:
+                return None
+            return payload.get("sub")
+    return None
+
+
+class RateLimitCharge:
+    """Prélèvement de jetons supplémentaires sur le seau de la requête en cours
+    (sous-requêtes de /api/batch), exposé dans `request.state.rate_limit`"""
+
+    def __init__(self, backend: RateLimitBackend, key: str, budget: Budget):
+        self.backend = backend
+        self.key = key
+        self.budget = budget
+
+    async def consume(self, cost: float) -> Tuple[bool, float]:
+        if self.backend.blocking:
+            return await run_in_threadpool(self.backend.consume, self.key, self.budget, cost)
+        return self.backend.consume(self.key, self.budget, cost)
+
+
+def too_many_requests(retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Trop de requêtes, réessayez plus tard"},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RateLimitMiddleware:
+    """Limite le débit par utilisateur authentifié, ou par IP à défaut (429 + Retry-After)"""
+
+    def __init__(self, app, backend: Optional[RateLimitBackend] = None,
+                 budgets=ROUTE_BUDGETS, default_budget: Optional[Budget] = DEFAULT_BUDGET,
+                 default_backend: Optional[RateLimitBackend] = None):
+        self.app = app
+        self.backend = backend or get_rate_limit_backend()
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.default_backend = default_backend or InMemoryBackend()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        route = (scope["method"], scope["path"])
+        budget = self.budgets.get(route)
+        backend = self.backend
+        if budget is None:
+            if not scope["path"].startswith("/api/") or self.default_budget is None:
+                return await self.app(scope, receive, send)
+            budget = self.default_budget
+            backend = self.default_backend
+            route = ("*", "/api")
+
+        username = _user_from_headers(scope)
+        if username:
+            client_key = f"user:{username}"
+        else:
+            client = scope.get("client")
+            client_key = f"ip:{client[0] if client else 'unknown'}"
+        key = f"{route[0]} {route[1]}|{client_key}"
+
+        charge = RateLimitCharge(backend, key, budget)
+        allowed, retry_after = await charge.consume(1)
+        if not allowed:
+            return await too_many_requests(retry_after)(scope, receive, send)
+        scope.setdefault("state", {})["rate_limit"] = charge
+        await self.app(scope, receive, send)
+
+
+class ConcurrencyLimitMiddleware:
+    """Admission globale : au plus `max_concurrent` requêtes en cours, les suivantes
+    attendent dans une file bornée ; au-delà (ou après `queue_timeout`), réponse 503.
+
+    `max_concurrent` correspond à la taille du pool de connexions, de sorte que la file
+    d'attente du pool ne grossisse jamais au-delà de `max_queued` requêtes."""
+
+    def __init__(self, app, max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+                 max_queued: int = MAX_QUEUED_REQUESTS,
+                 queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.app = app
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._queued = 0
+
+    async def try_acquire(self) -> bool:
+        """Prend une place sans attendre ni doubler la file (lectures parallèles
+        d'un lot, libérées par `release`)"""
+        if self._semaphore.locked():
+            return False
+        await self._semaphore.acquire()
+        return True
+
+    def release(self):
+        self._semaphore.release()
+
+    def _overloaded(self, scope, receive, send):
+        response = JSONResponse(
+            status_code=503,
+            content={"detail": "Serveur surchargé, réessayez plus tard"},
+            headers={"Retry-After": str(max(1, math.ceil(self.queue_timeout)))},
+        )
+        return response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        if self._semaphore.locked():
+            if self._queued >= self.max_queued:
+                return await self._overloaded(scope, receive, send)
+            self._queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                return await self._overloaded(scope, receive, send)
+            finally:
+                self._queued -= 1
+        else:
+            await self._semaphore.acquire()
+
+        scope.setdefault("state", {})["admission"] = self
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._semaphore.release()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import List, Optional
-from datetime import datetime
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
 
 
 # Schémas pour les Skills
@@ -22,6 +22,23 @@ class Skill(SkillBase):
         from_attributes = True
 
 
+# Niveau de maîtrise d'une compétence : 1 (débutant) à 5 (expert)
+class SkillLevelUpdate(BaseModel):
+    skill_id: int
+    level: int = Field(..., ge=1, le=5)
+    years_experience: Optional[float] = Field(None, ge=0, le=60)
+
+
+class SkillLevel(BaseModel):
+    skill_id: int
+    level: int
+    years_experience: float
+    endorsement_count: int
+
+    class Config:
+        from_attributes = True
+
+
 # Schémas pour les Languages
 class LanguageBase(BaseModel):
     name: str
@@ -47,6 +64,9 @@ class UserBase(BaseModel):
     full_name: Optional[str] = None
     bio: Optional[str] = None
     avatar_url: Optional[str] = None
+    location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class UserCreate(UserBase):
@@ -57,8 +77,19 @@ class UserUpdate(BaseModel):
     full_name: Optional[str] = None
     bio: Optional[str] = None
     avatar_url: Optional[str] = None
+    location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    # Remplacement complet de la liste...
     skills: Optional[List[int]] = None
     languages: Optional[List[int]] = None
+    # ...ou ajouts/retraits ponctuels
+    skills_add: Optional[List[int]] = None
+    skills_remove: Optional[List[int]] = None
+    languages_add: Optional[List[int]] = None
+    languages_remove: Optional[List[int]] = None
+    # Niveaux (la compétence est ajoutée au profil si besoin)
+    skill_levels: Optional[List[SkillLevelUpdate]] = None
 
 
 class User(UserBase):
@@ -68,6 +99,7 @@ class User(UserBase):
     created_at: datetime
     updated_at: datetime
     skills: List[Skill] = []
+    skill_levels: List[SkillLevel] = []
     languages: List[Language] = []
 
     class Config:
@@ -79,11 +111,19 @@ class UserWithProjects(User):
     collaborations: List["Project"] = []
 
 
+class SimilarUser(BaseModel):
+    user: User
+    similarity: float
+
+
 # Schémas pour les Projects
 class ProjectBase(BaseModel):
     title: str
     description: Optional[str] = None
     status: str = "en_cours"
+    location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class ProjectCreate(ProjectBase):
@@ -94,6 +134,9 @@ class ProjectUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     status: Optional[str] = None
+    location: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
 class Project(ProjectBase):
@@ -147,6 +190,8 @@ class UserLogin(BaseModel):
 # Schémas pour la recherche
 class SearchFilters(BaseModel):
     skills: Optional[List[str]] = None
+    # Niveau minimal par compétence (nom -> niveau de 1 à 5), tous exigés
+    min_levels: Optional[Dict[str, int]] = None
     languages: Optional[List[str]] = None
     is_verified: Optional[bool] = None
     search_term: Optional[str] = None
@@ -161,3 +206,96 @@ class TalentMapData(BaseModel):
     skills_distribution: List[dict]
     languages_distribution: List[dict]
     verified_users_count: int
+
+
+# Schémas pour le graphe de co-occurrence des compétences
+class SkillGraphNode(BaseModel):
+    id: int
+    name: str
+    category: Optional[str] = None
+    count: int
+
+
+class SkillGraphEdge(BaseModel):
+    source: int
+    target: int
+    count: int
+    jaccard: float
+
+
+class SkillCluster(BaseModel):
+    label: str
+    skill_ids: List[int]
+    size: int
+
+
+class TalentGraphData(BaseModel):
+    nodes: List[SkillGraphNode]
+    edges: List[SkillGraphEdge]
+    clusters: List[SkillCluster]
+
+
+# Schéma pour l'autocomplétion
+class AutocompleteItem(BaseModel):
+    id: int
+    kind: str
+    label: str
+    count: int
+
+
+# Schémas pour la carte géographique
+class GeoCluster(BaseModel):
+    geohash: str
+    latitude: float
+    longitude: float
+    user_count: int
+    project_count: int
+    top_skills: List[dict]
+
+
+class TalentGeoData(BaseModel):
+    zoom: int
+    precision: int
+    clusters: List[GeoCluster]
+
+
+class HistoryPoint(BaseModel):
+    period: date
+    delta: int
+    total: int
+
+
+class TalentHistory(BaseModel):
+    metric: str
+    granularity: str
+    points: List[HistoryPoint]
+
+
+class BatchRequestItem(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    query: Optional[Dict[str, Any]] = None
+    body: Optional[Any] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchRequestItem] = Field(..., min_length=1)
+
+
+class BatchResult(BaseModel):
+    id: Optional[str] = None
+    status: int
+    body: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchResult]
+
+
+class ProfileRequest(BaseModel):
+    # Gabarit de chemin (ex. /api/search) ; sans route, tous les threads sont échantillonnés
+    route: Optional[str] = None
+    method: str = "GET"
+    requests: int = Field(10, ge=1, le=1000)
+    seconds: float = Field(30, gt=0, le=300)
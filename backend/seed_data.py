@@ -1,4 +1,6 @@
-from database import SessionLocal, init_db, User, Skill, Language, Project
+from database import (
+    SessionLocal, init_db, rebuild_skill_level_counts, User, Skill, Language, Project, UserSkill
+)
 from auth import get_password_hash
 
 def seed_database():
@@ -33,6 +35,9 @@ def seed_database():
                 "username": "marie_dupont",
                 "full_name": "Marie Dupont",
                 "bio": "Développeuse Full Stack passionnée par l'IA et le web",
+                "location": "CESI Paris Nanterre",
+                "latitude": 48.8925,
+                "longitude": 2.2069,
                 "password": "password123"
             },
             {
@@ -40,6 +45,9 @@ def seed_database():
                 "username": "jean_martin",
                 "full_name": "Jean Martin",
                 "bio": "Designer UX/UI et expert en accessibilité",
+                "location": "CESI Lyon",
+                "latitude": 45.764,
+                "longitude": 4.8357,
                 "password": "password123"
             },
             {
@@ -47,6 +55,9 @@ def seed_database():
                 "username": "sophie_bernard",
                 "full_name": "Sophie Bernard",
                 "bio": "Chef de projet agile et coach Scrum",
+                "location": "CESI Paris Nanterre",
+                "latitude": 48.8925,
+                "longitude": 2.2069,
                 "password": "password123"
             },
             {
@@ -54,6 +65,9 @@ def seed_database():
                 "username": "lucas_petit",
                 "full_name": "Lucas Petit",
                 "bio": "Data Scientist spécialisé en Machine Learning",
+                "location": "CESI Lille",
+                "latitude": 50.6292,
+                "longitude": 3.0573,
                 "password": "password123"
             },
             {
@@ -61,6 +75,9 @@ def seed_database():
                 "username": "emma_rousseau",
                 "full_name": "Emma Rousseau",
                 "bio": "Développeuse mobile iOS et Android",
+                "location": "CESI Bordeaux",
+                "latitude": 44.8378,
+                "longitude": -0.5792,
                 "password": "password123"
             }
         ]
@@ -72,6 +89,9 @@ def seed_database():
                 username=user_data["username"],
                 full_name=user_data["full_name"],
                 bio=user_data["bio"],
+                location=user_data["location"],
+                latitude=user_data["latitude"],
+                longitude=user_data["longitude"],
                 hashed_password=get_password_hash(user_data["password"])
             )
             users.append(user)
@@ -155,6 +175,26 @@ def seed_database():
         
         db.commit()
         
+        # Niveaux de maîtrise (1 débutant à 5 expert) et années d'expérience,
+        # par utilisateur puis par compétence
+        skill_levels = {
+            0: {0: (5, 6), 1: (4, 5), 2: (4, 4), 3: (3, 2), 4: (4, 4), 15: (3, 3)},
+            1: {6: (5, 7), 7: (4, 5), 8: (4, 4), 13: (3, 2)},
+            2: {9: (5, 8), 10: (4, 6), 11: (4, 5), 12: (3, 3)},
+            3: {0: (5, 5), 4: (4, 3), 5: (5, 4), 15: (3, 2)},
+            4: {1: (4, 3), 2: (5, 4), 15: (3, 2), 14: (4, 3)},
+        }
+        for user_index, levels in skill_levels.items():
+            for skill_index, (level, years) in levels.items():
+                db.query(UserSkill).filter(
+                    UserSkill.user_id == users[user_index].id,
+                    UserSkill.skill_id == skills[skill_index].id
+                ).update({"level": level, "years_experience": years})
+        # Associations écrites par l'ORM : compteurs par niveau recalculés
+        rebuild_skill_level_counts(db)
+        
+        db.commit()
+        
         # Créer des projets
         projects_data = [
             {
@@ -185,7 +225,14 @@ def seed_database():
         
         for project_data in projects_data:
             owner = project_data.pop("owner")
-            project = Project(**project_data, owner_id=owner.id)
+            # Le projet est localisé sur le campus de son porteur
+            project = Project(
+                **project_data,
+                owner_id=owner.id,
+                location=owner.location,
+                latitude=owner.latitude,
+                longitude=owner.longitude
+            )
             db.add(project)
         
         db.commit()
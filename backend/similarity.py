@@ -0,0 +1,142 @@
+import random
+import threading
+import zlib
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import user_skills, user_languages
+from invalidation import bus
+
+NUM_PERM = 64
+BANDS = 16  # 16 bandes de 4 lignes : seuil de Jaccard autour de 0,5
+_PRIME = (1 << 61) - 1
+
+
+def user_tokens(skill_ids: Iterable[int], language_ids: Iterable[int]) -> FrozenSet[str]:
+    return frozenset([f"s{i}" for i in skill_ids] + [f"l{i}" for i in language_ids])
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHashLSH:
+    """Signatures MinHash des ensembles compétences + langues, rangées dans un
+    index LSH par bandes : une requête ne compare que les utilisateurs qui
+    partagent au moins une bande, puis les classe par Jaccard exact"""
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = BANDS, seed: int = 1):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self._params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._token_hashes: Dict[str, Tuple[int, ...]] = {}
+        self._sets: Dict[int, FrozenSet[str]] = {}
+        self._keys: Dict[int, List[tuple]] = {}
+        self._buckets: Dict[tuple, set] = defaultdict(set)
+
+    def _hashes(self, token: str) -> Tuple[int, ...]:
+        # Le vocabulaire (compétences + langues) est petit : les hachages par jeton sont mémorisés
+        hashes = self._token_hashes.get(token)
+        if hashes is None:
+            x = zlib.crc32(token.encode())
+            hashes = self._token_hashes[token] = tuple((a * x + b) % _PRIME for a, b in self._params)
+        return hashes
+
+    def signature(self, tokens: FrozenSet[str]) -> Tuple[int, ...]:
+        return tuple(map(min, zip(*(self._hashes(t) for t in tokens))))
+
+    def _band_keys(self, signature) -> List[tuple]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def remove(self, user_id: int):
+        for key in self._keys.pop(user_id, ()):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._buckets[key]
+        self._sets.pop(user_id, None)
+
+    def set(self, user_id: int, tokens: FrozenSet[str]):
+        self.remove(user_id)
+        if not tokens:
+            return
+        keys = self._band_keys(self.signature(tokens))
+        self._sets[user_id] = tokens
+        self._keys[user_id] = keys
+        for key in keys:
+            self._buckets[key].add(user_id)
+
+    def tokens(self, user_id: int) -> FrozenSet[str]:
+        return self._sets.get(user_id, frozenset())
+
+    def query(self, tokens: FrozenSet[str], k: int, exclude: int = None) -> List[Tuple[int, float]]:
+        if not tokens:
+            return []
+        candidates = set()
+        for key in self._band_keys(self.signature(tokens)):
+            candidates |= self._buckets.get(key, set())
+        candidates.discard(exclude)
+        scored = [(candidate, jaccard(tokens, self._sets[candidate])) for candidate in candidates]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:k]
+
+    def brute_force(self, tokens: FrozenSet[str], k: int, exclude: int = None) -> List[Tuple[int, float]]:
+        """Référence exacte (parcours complet), pour mesurer le rappel de l'index"""
+        scored = [(user_id, jaccard(tokens, s)) for user_id, s in self._sets.items() if user_id != exclude]
+        scored = [item for item in scored if item[1] > 0]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:k]
+
+
+class SimilarTalents:
+    """Index LSH des profils, chargé depuis la base puis tenu à jour par update_user"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._index = MinHashLSH()
+
+    def load(self, db: Session):
+        skills = defaultdict(list)
+        languages = defaultdict(list)
+        for user_id, skill_id in db.execute(select(user_skills.c.user_id, user_skills.c.skill_id)):
+            skills[user_id].append(skill_id)
+        for user_id, language_id in db.execute(select(user_languages.c.user_id, user_languages.c.language_id)):
+            languages[user_id].append(language_id)
+
+        index = MinHashLSH()
+        for user_id in skills.keys() | languages.keys():
+            index.set(user_id, user_tokens(skills[user_id], languages[user_id]))
+        with self._lock:
+            self._index = index
+            self._loaded = True
+
+    def ensure_loaded(self, db: Session):
+        if not self._loaded:
+            self.load(db)
+
+    def set_user(self, user_id: int, skill_ids, language_ids):
+        # État absolu et non delta : rejouer l'événement sur un autre worker est sans risque
+        with self._lock:
+            if self._loaded:
+                self._index.set(user_id, user_tokens(skill_ids, language_ids))
+
+    def similar(self, db: Session, user_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        self.ensure_loaded(db)
+        with self._lock:
+            return self._index.query(self._index.tokens(user_id), k, exclude=user_id)
+
+
+similar_talents = SimilarTalents()
+
+bus.subscribe("similarity", lambda payload: similar_talents.set_user(
+    payload["user_id"], payload["skills"], payload["languages"]
+))
@@ -0,0 +1,292 @@
+import heapq
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from itertools import combinations
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
+
+from database import Skill, User, user_skills
+from invalidation import bus
+
+# Graphes construits mémorisés (LRU), indexés par les filtres de la requête
+MAX_CACHED_GRAPHS = 64
+# Arêtes renvoyées par compétence : une arête est gardée si elle figure parmi
+# les plus fortes (Jaccard) de l'une de ses deux extrémités
+MAX_EDGES_PER_NODE = 10
+
+
+def _pairs(skill_ids: Iterable[int]):
+    return combinations(sorted(set(skill_ids)), 2)
+
+
+def _edge_strength(edge):
+    # Départage stable : le résultat ne dépend pas de l'ordre des mises à jour
+    return edge["jaccard"], edge["count"], -edge["source"], -edge["target"]
+
+
+class _Graph:
+    """Graphe filtré d'une requête, tenu à jour compétence par compétence.
+
+    Seules les arêtes qui passent les filtres (`min_count`, `min_jaccard`) sont
+    gardées. Une modification de profil marque ses compétences comme à revoir ;
+    leurs arêtes sont recalculées à la lecture suivante, sans reparcourir la matrice."""
+
+    def __init__(self, source: "SkillCooccurrence", category, verified_only, min_count, min_jaccard):
+        self.source = source
+        self.category = category
+        self.verified_only = verified_only
+        self.min_count = min_count
+        self.min_jaccard = min_jaccard
+        self.dirty = set()
+        self._edges: Dict[Tuple[int, int], dict] = {}
+        self._adjacent = defaultdict(set)
+        self._result = None
+        for i, j in source._pairs[verified_only]:
+            self._set_edge(i, j)
+
+    def _selected(self, skill_id) -> bool:
+        skill = self.source._skills.get(skill_id)
+        return skill is not None and (self.category is None or skill["category"] == self.category)
+
+    def _set_edge(self, i, j):
+        counts = self.source._counts[self.verified_only]
+        count = self.source._pairs[self.verified_only][(i, j)]
+        jaccard = count / (counts[i] + counts[j] - count) if count else 0.0
+        if (count and count >= self.min_count and jaccard >= self.min_jaccard
+                and self._selected(i) and self._selected(j)):
+            self._edges[(i, j)] = {"source": i, "target": j, "count": count, "jaccard": round(jaccard, 4)}
+            self._adjacent[i].add(j)
+            self._adjacent[j].add(i)
+        elif self._edges.pop((i, j), None) is not None:
+            self._adjacent[i].discard(j)
+            self._adjacent[j].discard(i)
+
+    def _refresh(self):
+        # Le Jaccard d'une arête dépend des effectifs de ses extrémités : toutes
+        # les arêtes touchant une compétence modifiée sont recalculées
+        neighbors = self.source._neighbors[self.verified_only]
+        for skill_id in self.dirty:
+            for other in neighbors.get(skill_id, set()) | self._adjacent.get(skill_id, set()):
+                self._set_edge(min(skill_id, other), max(skill_id, other))
+        self.dirty.clear()
+        self._result = None
+
+    def result(self) -> dict:
+        if self.dirty:
+            self._refresh()
+        if self._result is None:
+            self._result = self._build()
+        return self._result
+
+    def _build(self) -> dict:
+        counts = self.source._counts[self.verified_only]
+        nodes = [
+            {"id": skill_id, "name": self.source._skills[skill_id]["name"],
+             "category": self.source._skills[skill_id]["category"], "count": counts[skill_id]}
+            for skill_id in sorted(counts) if self._selected(skill_id)
+        ]
+
+        # Arêtes les plus fortes de chaque compétence
+        ranked = defaultdict(list)
+        for edge in self._edges.values():
+            ranked[edge["source"]].append(edge)
+            ranked[edge["target"]].append(edge)
+        kept = {}
+        for edges in ranked.values():
+            for edge in heapq.nlargest(MAX_EDGES_PER_NODE, edges, key=_edge_strength):
+                kept[(edge["source"], edge["target"])] = edge
+        edges = sorted(kept.values(), key=lambda e: (-e["count"], e["source"], e["target"]))
+
+        # Groupes : composantes connexes du graphe de toutes les arêtes retenues
+        parent = {node["id"]: node["id"] for node in nodes}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for i, j in self._edges:
+            parent[find(i)] = find(j)
+
+        groups: Dict[int, list] = {}
+        for node in nodes:
+            groups.setdefault(find(node["id"]), []).append(node)
+        clusters = []
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda n: -n["count"])
+            clusters.append({
+                "label": members[0]["name"],
+                "skill_ids": [n["id"] for n in members],
+                "size": len(members),
+            })
+        clusters.sort(key=lambda c: -c["size"])
+
+        return {"nodes": nodes, "edges": edges, "clusters": clusters}
+
+
+class SkillCooccurrence:
+    """Matrice creuse de co-occurrence compétence × compétence, gardée en mémoire.
+
+    Chargée une fois depuis `user_skills` (auto-jointure agrégée par la base),
+    puis tenue à jour par deltas à chaque modification de profil. Deux matrices
+    sont maintenues, indexées par `verified_only` : tous les utilisateurs, et les
+    seuls utilisateurs vérifiés. Les compétences de chaque utilisateur sont
+    gardées pour calculer ces deltas à partir d'un état absolu."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._skills: Dict[int, dict] = {}
+        self._users: Dict[int, Tuple[tuple, bool]] = {}
+        self._counts = {False: Counter(), True: Counter()}
+        self._pairs = {False: Counter(), True: Counter()}
+        self._neighbors = {False: defaultdict(set), True: defaultdict(set)}
+        self._graphs = OrderedDict()
+
+    # ---------- Chargement ----------
+
+    def load(self, db: Session):
+        a = aliased(user_skills)
+        b = aliased(user_skills)
+        skills = db.execute(select(Skill.id, Skill.name, Skill.category)).all()
+        rows = db.execute(
+            select(user_skills.c.user_id, user_skills.c.skill_id, User.is_verified)
+            .join(User, User.id == user_skills.c.user_id)
+        ).all()
+        pairs = db.execute(
+            select(a.c.skill_id, b.c.skill_id, User.is_verified, func.count())
+            .join(b, (a.c.user_id == b.c.user_id) & (a.c.skill_id < b.c.skill_id))
+            .join(User, User.id == a.c.user_id)
+            .group_by(a.c.skill_id, b.c.skill_id, User.is_verified)
+        ).all()
+
+        user_skill_ids = defaultdict(list)
+        verified_users = set()
+        counts = {False: Counter(), True: Counter()}
+        for user_id, skill_id, verified in rows:
+            user_skill_ids[user_id].append(skill_id)
+            counts[False][skill_id] += 1
+            if verified:
+                verified_users.add(user_id)
+                counts[True][skill_id] += 1
+        matrix = {False: Counter(), True: Counter()}
+        neighbors = {False: defaultdict(set), True: defaultdict(set)}
+        for i, j, verified, count in pairs:
+            for scope in ((False, True) if verified else (False,)):
+                matrix[scope][(i, j)] += count
+                neighbors[scope][i].add(j)
+                neighbors[scope][j].add(i)
+
+        with self._lock:
+            self._skills = {s.id: {"name": s.name, "category": s.category} for s in skills}
+            self._users = {
+                user_id: (tuple(sorted(ids)), user_id in verified_users)
+                for user_id, ids in user_skill_ids.items()
+            }
+            self._counts = counts
+            self._pairs = matrix
+            self._neighbors = neighbors
+            self._graphs.clear()
+            self._loaded = True
+
+    def ensure_loaded(self, db: Session):
+        if not self._loaded:
+            self.load(db)
+
+    def invalidate(self):
+        """Oublie tout ; la prochaine lecture rechargera depuis la base"""
+        with self._lock:
+            self._loaded = False
+            self._graphs.clear()
+
+    # ---------- Mises à jour incrémentales ----------
+
+    def _apply(self, skill_ids, verified_only: bool, sign: int):
+        counts = self._counts[verified_only]
+        pairs = self._pairs[verified_only]
+        neighbors = self._neighbors[verified_only]
+        for skill_id in skill_ids:
+            counts[skill_id] += sign
+            # Les compteurs tombés à zéro sont retirés pour garder la matrice creuse
+            if counts[skill_id] <= 0:
+                del counts[skill_id]
+        for i, j in _pairs(skill_ids):
+            pairs[(i, j)] += sign
+            if pairs[(i, j)] <= 0:
+                del pairs[(i, j)]
+                neighbors[i].discard(j)
+                neighbors[j].discard(i)
+            else:
+                neighbors[i].add(j)
+                neighbors[j].add(i)
+
+    def set_user(self, user_id: int, skill_ids, verified: bool):
+        """Enregistre les compétences et le statut actuels d'un utilisateur.
+
+        État absolu et non delta : rejouer l'événement sur un autre worker est sans risque."""
+        skill_ids = frozenset(skill_ids)
+        verified = bool(verified)
+        with self._lock:
+            if not self._loaded:
+                return
+            if not skill_ids <= self._skills.keys():
+                # Compétence créée hors de l'API : rechargement complet
+                self.invalidate()
+                return
+            old_ids, was_verified = self._users.get(user_id, ((), False))
+            old_ids = frozenset(old_ids)
+            for verified_only, before, after in (
+                (False, old_ids, skill_ids),
+                (True, old_ids if was_verified else frozenset(), skill_ids if verified else frozenset()),
+            ):
+                if before == after:
+                    continue
+                self._apply(before, verified_only, -1)
+                self._apply(after, verified_only, +1)
+                for graph in self._graphs.values():
+                    if graph.verified_only == verified_only:
+                        graph.dirty |= before ^ after
+            if skill_ids:
+                self._users[user_id] = (tuple(sorted(skill_ids)), verified)
+            else:
+                self._users.pop(user_id, None)
+
+    def add_skill(self, skill_id: int, name: str, category: Optional[str]):
+        # Une compétence neuve n'a encore aucun utilisateur : les graphes sont inchangés
+        with self._lock:
+            if self._loaded:
+                self._skills[skill_id] = {"name": name, "category": category}
+
+    def apply_event(self, payload: dict):
+        """Rejoue un événement `skill_graph` publié par un autre worker"""
+        if "skill" in payload:
+            skill = payload["skill"]
+            self.add_skill(skill["id"], skill["name"], skill["category"])
+        if "user_id" in payload:
+            self.set_user(payload["user_id"], payload["skills"], payload["verified"])
+
+    # ---------- Lecture ----------
+
+    def graph(self, db: Session, category: Optional[str] = None, verified_only: bool = False,
+              min_count: int = 1, min_jaccard: float = 0.1) -> dict:
+        self.ensure_loaded(db)
+        key = (category, verified_only, min_count, min_jaccard)
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+            else:
+                graph = self._graphs[key] = _Graph(self, category, verified_only, min_count, min_jaccard)
+                if len(self._graphs) > MAX_CACHED_GRAPHS:
+                    self._graphs.popitem(last=False)
+            return graph.result()
+
+
+skill_graph = SkillCooccurrence()
+
+bus.subscribe("skill_graph", skill_graph.apply_event)
@@ -52,6 +52,7 @@ export const usersAPI = {
   update: (data) => api.put('/users/me', data),
   verify: (userId) => api.post(`/users/${userId}/verify`),
   search: (filters) => api.post('/search', filters),
+  getSimilar: (id, k = 10) => api.get(`/users/${id}/similar`, { params: { k } }),
 };
 
 // Compétences
@@ -73,6 +74,7 @@ export const projectsAPI = {
   create: (data) => api.post('/projects', data),
   update: (id, data) => api.put(`/projects/${id}`, data),
   delete: (id) => api.delete(`/projects/${id}`),
+  restore: (id) => api.post(`/projects/${id}/restore`),
   getCollaborationRequests: (projectId) => api.get(`/projects/${projectId}/collaboration-requests`),
 };
 
@@ -80,11 +82,37 @@ export const projectsAPI = {
 export const collaborationAPI = {
   create: (data) => api.post('/collaboration-requests', data),
   accept: (requestId) => api.put(`/collaboration-requests/${requestId}/accept`),
+  restore: (requestId) => api.post(`/collaboration-requests/${requestId}/restore`),
+};
+
+// Autocomplétion (kind : skill, language ou user)
+export const autocompleteAPI = {
+  search: (q, kind = 'skill', limit = 10) => api.get('/autocomplete', { params: { q, kind, limit } }),
 };
 
 // Carte des talents
 export const talentMapAPI = {
   getData: () => api.get('/talent-map'),
+  getGraph: (params) => api.get('/talent-map/graph', { params }),
+  getGeo: (bbox, zoom) => api.get('/talent-map/geo', { params: { bbox: bbox.join(','), zoom } }),
+  getHistory: (metric, params) => api.get('/talent-map/history', { params: { metric, ...params } }),
+};
+
+// Requêtes groupées : plusieurs appels en un seul aller-retour.
+// Chaque élément est { method, path, query, body } ; les résultats sont
+// retournés dans l'ordre, au format { status, data } comme les réponses axios.
+export const batchAPI = {
+  run: async (requests) => {
+    const response = await api.post('/batch', { requests });
+    return response.data.responses.map(({ status, body }) => {
+      if (status >= 400) {
+        const error = new Error(`Requête groupée en échec (${status})`);
+        error.response = { status, data: body };
+        throw error;
+      }
+      return { status, data: body };
+    });
+  },
 };
 
 export default api;
@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { useAuth } from '../AuthContext';
-import { talentMapAPI, projectsAPI } from '../api';
+import { batchAPI } from '../api';
 import { Users, Award, Globe, FolderOpen, TrendingUp, CheckCircle, ArrowRight } from 'lucide-react';
 import './Home.css';
 
@@ -17,9 +17,9 @@ const Home = () => {
 
   const loadData = async () => {
     try {
-      const [statsResponse, projectsResponse] = await Promise.all([
-        talentMapAPI.getData(),
-        projectsAPI.getAll({ limit: 3 })
+      const [statsResponse, projectsResponse] = await batchAPI.run([
+        { path: '/api/talent-map' },
+        { path: '/api/projects', query: { limit: 3 } }
       ]);
       setStats(statsResponse.data);
       setRecentProjects(projectsResponse.data);
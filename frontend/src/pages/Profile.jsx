@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { useAuth } from '../AuthContext';
-import { usersAPI, skillsAPI, languagesAPI } from '../api';
+import { usersAPI, batchAPI } from '../api';
 import { User, Mail, Edit2, Save, X, CheckCircle, Award, Globe, Briefcase } from 'lucide-react';
 import './Profile.css';
 
@@ -25,9 +25,9 @@ const Profile = () => {
 
   const loadData = async () => {
     try {
-      const [skillsResponse, languagesResponse] = await Promise.all([
-        skillsAPI.getAll(),
-        languagesAPI.getAll()
+      const [skillsResponse, languagesResponse] = await batchAPI.run([
+        { path: '/api/skills' },
+        { path: '/api/languages' }
       ]);
       
       setAllSkills(skillsResponse.data);